@@ -17,10 +17,10 @@ def initialize_finance_chromadb():
     examples_collection = client.get_or_create_collection("query_examples")
     feedback_collection = client.get_or_create_collection("user_feedback")
 
-    # Load and insert schemas
+    # Load and upsert schemas, rules and examples so edits to the JSON files replace stale entries
     schemas = load_json_file("chromadb_data/schemas.json")
     for entry in schemas:
-        schema_collection.add(
+        schema_collection.upsert(
             documents=[entry["document"]],
             metadatas=[{k: entry[k] for k in entry if k not in ["document", "id"]}],
             ids=[entry["id"]]
@@ -29,7 +29,7 @@ def initialize_finance_chromadb():
     # Load and insert rules
     rules = load_json_file("chromadb_data/rules.json")
     for rule in rules:
-        rules_collection.add(
+        rules_collection.upsert(
             documents=[rule["document"]],
             metadatas=[{k: rule[k] for k in rule if k not in ["document", "id"]}],
             ids=[rule["id"]]
@@ -38,7 +38,7 @@ def initialize_finance_chromadb():
     # Load and insert example queries
     examples = load_json_file("chromadb_data/examples.json")
     for example in examples:
-        examples_collection.add(
+        examples_collection.upsert(
             documents=[example["document"]],
             metadatas=[{k: example[k] for k in example if k not in ["document", "id"]}],
             ids=[example["id"]]
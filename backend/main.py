@@ -1,23 +1,45 @@
 import os
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, aclosing
 from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import pandas as pd
 import numpy as np
-from sqlalchemy import create_engine, text
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import NoSuchTableError
 import shutil
-import requests
-import re
+import httpx
+import json
 from dotenv import load_dotenv
 import chromadb
 from initialize_chromadb import initialize_finance_chromadb
 from datetime import datetime
 import uuid
+from typing import Optional, Union
 from utils.feedback_utils import save_feedback_to_json, load_feedback_to_chromadb
 from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
 from utils.logging_utils import setup_logging, get_logger, set_log_level, get_current_log_level
-from utils.question_utils import get_all_questions
+from utils.question_utils import get_all_questions, normalize_question
+from utils.embedding_utils import EmbeddingCache
+from utils.exact_match_index import ExactMatchIndex
+from utils.prompt_utils import PromptContextCache, build_sql_prompt
+from utils.ollama_client import OllamaClient
+from utils.sql_utils import extract_sql, find_complete_sql
+from utils.sql_rewrite import optimize_sql
+from utils.singleflight import SingleFlight
+from utils.result_cache import ResultCache
+from utils.query_guard import guarded_read_sql
+from utils.snapshot_utils import (
+    WEEKLY_TRENDS_SQL, derived_tables_need_backfill, ensure_derived_tables, refresh_derived_tables
+)
+from utils.excel_cache import WorkbookCache, file_sha256
+from utils.ingestion_jobs import JobManager
+from utils.file_watcher import WorkbookWatcher
+from utils.db_utils import (
+    DatabaseExecutor, create_db_engine, stream_query_ndjson, sync_table, round_datetimes, get_table, encode_cursor, decode_cursor, estimate_table_rows
+)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -26,59 +48,297 @@ logger = setup_logging()
 
 OLLAMA_API_URL = os.getenv("OLLAMA_API_URL")
 MODEL_NAME = os.getenv("MODEL_NAME")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "4"))
+OLLAMA_MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "4"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "60"))
+OLLAMA_OPTIONS = {
+    "num_ctx": 6144,
+    "temperature": 0.1,
+    "top_p": 0.9,
+    "num_predict": 200
+}
 ST_MODEL_NAME = os.getenv("ST_MODEL_NAME")
 host = os.getenv("DB_HOST")
 port = os.getenv("DB_PORT")
 user = os.getenv("DB_USER")
 password = os.getenv("DB_PASSWORD")
 database = os.getenv("DB_NAME")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Excel loads insert new rows in multi-row INSERTs of this size, or via LOAD DATA LOCAL INFILE when enabled
+DB_INSERT_CHUNK_SIZE = int(os.getenv("DB_INSERT_CHUNK_SIZE", "1000"))
+DB_LOAD_DATA_LOCAL = os.getenv("DB_LOAD_DATA_LOCAL", "false").lower() == "true"
 
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "512"))
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "4096"))
+PROMPT_TOP_K_EXAMPLES = int(os.getenv("PROMPT_TOP_K_EXAMPLES", "5"))
+PROMPT_TOP_K_FEEDBACK = int(os.getenv("PROMPT_TOP_K_FEEDBACK", "5"))
+# Opt-in: start Ollama while the retrieval tiers run instead of after they all miss
+SPECULATIVE_RESOLUTION = os.getenv("SPECULATIVE_RESOLUTION", "false").lower() == "true"
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+DB_MAX_CONCURRENCY = int(os.getenv("DB_MAX_CONCURRENCY", "4"))
+DB_STREAM_BATCH_SIZE = int(os.getenv("DB_STREAM_BATCH_SIZE", "1000"))
+# Parsed Excel workbooks are cached here as Parquet (empty disables the cache)
+EXCEL_CACHE_DIR = os.getenv("EXCEL_CACHE_DIR", "db/.cache")
+# Bump whenever clean_excel_data changes its output, so cached workbooks are parsed again
+EXCEL_CLEANING_VERSION = 2
+# Reload a db/ workbook in the background once it has stopped changing for the debounce window
+WORKBOOK_WATCH_ENABLED = os.getenv("WORKBOOK_WATCH_ENABLED", "true").lower() == "true"
+WORKBOOK_WATCH_INTERVAL = float(os.getenv("WORKBOOK_WATCH_INTERVAL", "2"))
+WORKBOOK_WATCH_DEBOUNCE = float(os.getenv("WORKBOOK_WATCH_DEBOUNCE", "3"))
+# Rewrite known slow SQL patterns (e.g. correlated latest-row lookups) before execution
+SQL_REWRITE = os.getenv("SQL_REWRITE", "true").lower() == "true"
+# Guardrails for /execute_sql and /smart_query (0 disables a guard)
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "10000"))
+QUERY_TIMEOUT_MS = int(os.getenv("QUERY_TIMEOUT_MS", "15000"))
+QUERY_MAX_ESTIMATED_ROWS = int(os.getenv("QUERY_MAX_ESTIMATED_ROWS", "5000000"))
+TABLE_PAGE_SIZE = int(os.getenv("TABLE_PAGE_SIZE", "500"))
+TABLE_PAGE_MAX = int(os.getenv("TABLE_PAGE_MAX", "5000"))
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+COLUMNAR_MEDIA_TYPE = "application/vnd.finance.columnar+json"
+
+ACCOUNTS_WORKBOOK = "db/accounts.xlsx"
+SNAPSHOTS_WORKBOOK = "db/account_weekly_snapshot.xlsx"
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 embedding_fn = SentenceTransformerEmbeddingFunction(model_name=ST_MODEL_NAME)
+embedding_cache = EmbeddingCache(embedding_fn, max_size=EMBEDDING_CACHE_SIZE)
+exact_match_index = ExactMatchIndex()
+query_flights = SingleFlight()
 
 # Database config
-engine = create_engine(f"mysql+pymysql://{user}:{password}@{host}:{port}/{database}")
+engine = create_db_engine(
+    f"mysql+pymysql://{user}:{password}@{host}:{port}/{database}",
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    local_infile=DB_LOAD_DATA_LOCAL
+)
+result_cache = ResultCache(max_bytes=RESULT_CACHE_MAX_BYTES)
+# Blocking pandas/SQLAlchemy calls from async endpoints run here, off the event loop
+db_executor = DatabaseExecutor(max_workers=DB_MAX_CONCURRENCY)
+workbook_cache = WorkbookCache(EXCEL_CACHE_DIR, version=EXCEL_CLEANING_VERSION) if EXCEL_CACHE_DIR else None
+# Uploads and reloads are parsed and loaded here, one at a time, outside the request
+ingestion_jobs = JobManager(max_workers=1)
 
 client = chromadb.HttpClient(host="chromadb", port=8000)
 
+ollama_client = OllamaClient(
+    OLLAMA_API_URL,
+    MODEL_NAME,
+    timeout=OLLAMA_TIMEOUT,
+    connect_timeout=OLLAMA_CONNECT_TIMEOUT,
+    max_connections=OLLAMA_MAX_CONNECTIONS,
+    max_keepalive_connections=OLLAMA_MAX_KEEPALIVE,
+    keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY
+)
+
+
+EXCEL_NULL_TOKENS = ["null", "none", "nan"]
+# pandas.api.types.infer_dtype results for object columns that may hold strings
+STRING_INFERRED_TYPES = ("string", "empty", "mixed", "mixed-integer")
+
 
 def clean_excel_data(df):
+    """
+    Normalize column names, trim strings and turn null tokens and NaN in text columns into None
+
+    Works column by column with vectorised string operations; only object columns
+    are touched, since numeric and datetime columns hold no strings to clean.
+    Bump EXCEL_CLEANING_VERSION when changing what this returns.
+    """
     df.columns = df.columns.str.strip().str.lower()
-    df = df.map(lambda x: str(x).strip() if isinstance(x, str) else x)
-    df = df.map(lambda x: None if str(x).lower() in ["null", "none", "nan"] else x)
+    for position in range(df.shape[1]):
+        values = df.iloc[:, position]
+        if values.dtype != object:
+            continue
+        is_null = values.isna()
+        if pd.api.types.infer_dtype(values, skipna=True) in STRING_INFERRED_TYPES:
+            stripped = values.str.strip()
+            is_text = stripped.notna()
+            values = stripped.where(is_text, values)
+            is_null = (is_null & ~is_text) | stripped.str.lower().isin(EXCEL_NULL_TOKENS)
+        # infer_objects gives e.g. a float column once its "null" strings are gone
+        df.isetitem(position, values.mask(is_null, None).infer_objects())
     return df
 
 
-def load_accounts_from_excel(filepath: str):
-    df = pd.read_excel(filepath)
-    df = clean_excel_data(df)
+def parse_workbook(filepath: str):
+    return clean_excel_data(pd.read_excel(filepath))
+
+
+def read_workbook(filepath: str):
+    """Cleaned contents of a workbook, from the parsed-workbook cache when the file is unchanged"""
+    if workbook_cache is None:
+        return parse_workbook(filepath)
+    return workbook_cache.get(filepath, parse_workbook)
+
+
+def load_accounts(df, delete_missing=True):
+    """
+    Synchronize the accounts table with a cleaned DataFrame
+
+    Args:
+        df (DataFrame): Cleaned account rows
+        delete_missing (bool): Delete accounts that are not in df (full load) or keep them (merge)
+
+    Returns:
+        dict: Number of rows inserted, updated and deleted
+    """
     with engine.begin() as conn:
-        conn.execute(text("DELETE FROM accounts"))
-        df.to_sql("accounts", con=conn, if_exists="append", index=False)
+        changes = sync_table(
+            conn, "accounts", df, ["bank", "type"], delete_missing=delete_missing,
+            chunk_size=DB_INSERT_CHUNK_SIZE, load_data_local=DB_LOAD_DATA_LOCAL
+        )
+        changed = any(changes.values())
+        if changed:
+            # Credit limits feed the rollup, and removed accounts cascade to their snapshots
+            refresh_derived_tables(conn)
+    if changed:
+        result_cache.bump_generation()
+    return changes
 
 
-def load_account_snapshots_from_excel(filepath: str):
-    df = pd.read_excel(filepath)
-    df = clean_excel_data(df)
+def prepare_snapshots(df):
+    """
+    Default missing amounts to 0, drop snapshot rows without a full primary key and
+    round last_updated_date to the whole seconds account_weekly_snapshot stores
+    """
     df["payment_due"] = df["payment_due"].fillna(0)
     df["balance"] = df["balance"].fillna(0)
     df = df.dropna(subset=["bank", "type", "last_updated_date"], how="any")
+    df = df.assign(last_updated_date=pd.to_datetime(df["last_updated_date"], format="ISO8601"))
+    return round_datetimes(df)
+
+
+def load_account_snapshots(df, delete_missing=True):
+    """
+    Synchronize account_weekly_snapshot (and its derived tables) with prepared snapshot rows
+
+    Args:
+        df (DataFrame): Output of prepare_snapshots
+        delete_missing (bool): Delete snapshots that are not in df (full load) or keep them (merge)
+
+    Returns:
+        dict: Number of rows inserted, updated and deleted
+    """
     with engine.begin() as conn:
-        conn.execute(text("DELETE FROM account_weekly_snapshot"))
-        df.to_sql("account_weekly_snapshot", con=conn, if_exists="append", index=False)
+        changes = sync_table(
+            conn, "account_weekly_snapshot", df, ["bank", "type", "last_updated_date"],
+            delete_missing=delete_missing, chunk_size=DB_INSERT_CHUNK_SIZE, load_data_local=DB_LOAD_DATA_LOCAL
+        )
+        if any(changes.values()):
+            # Rollup weeks before the earliest changed snapshot cannot have changed
+            since = changes.changed_keys["last_updated_date"].min()
+            derived_changes = refresh_derived_tables(conn, since=since)
+        elif derived_tables_need_backfill(conn):
+            derived_changes = refresh_derived_tables(conn)
+        else:
+            derived_changes = 0
+    if any(changes.values()) or derived_changes:
+        result_cache.bump_generation()
+    return changes
+
+
+def load_accounts_from_excel(filepath: str):
+    return load_accounts(read_workbook(filepath))
+
+
+def load_account_snapshots_from_excel(filepath: str):
+    return load_account_snapshots(prepare_snapshots(read_workbook(filepath)))
+
+
+def reload_workbook_job(filepath, report, skip_if_loaded=False):
+    """
+    Diff-load one changed workbook into its table; only that workbook is parsed
+
+    The content hash is handed to the workbook watcher after a successful load, so
+    the watcher does not queue a second reload for a save that was already loaded.
 
+    Args:
+        filepath (str): ACCOUNTS_WORKBOOK or SNAPSHOTS_WORKBOOK
+        report (callable): Job progress callback
+        skip_if_loaded (bool): Do nothing if this content was already loaded
+    """
+    sha256 = file_sha256(filepath)
+    if skip_if_loaded and workbook_watcher is not None and workbook_watcher.loaded_hash(filepath) == sha256:
+        logger.info(f"{filepath} is already loaded; skipping reload")
+        report(rows_parsed=0, rows_loaded=0, changes={"inserted": 0, "updated": 0, "deleted": 0})
+        return
+    if filepath == ACCOUNTS_WORKBOOK:
+        df = read_workbook(filepath)
+        load = load_accounts
+    else:
+        df = prepare_snapshots(read_workbook(filepath))
+        load = load_account_snapshots
+    report(rows_parsed=len(df))
+    changes = load(df)
+    if workbook_watcher is not None:
+        workbook_watcher.mark_loaded(filepath, sha256)
+    report(rows_loaded=changes["inserted"] + changes["updated"], changes=changes)
+
+
+def queue_workbook_reload(filepath):
+    ingestion_jobs.submit(
+        "auto_reload", filepath, lambda report: reload_workbook_job(filepath, report, skip_if_loaded=True)
+    )
+
+
+workbook_watcher = WorkbookWatcher(
+    [ACCOUNTS_WORKBOOK, SNAPSHOTS_WORKBOOK],
+    queue_workbook_reload,
+    interval=WORKBOOK_WATCH_INTERVAL,
+    debounce=WORKBOOK_WATCH_DEBOUNCE
+) if WORKBOOK_WATCH_ENABLED else None
+
+
+ACCOUNT_TYPES = ("credit", "checking", "stocks", "crypto")
+UPLOAD_EXTENSIONS = (".xlsx", ".xls", ".csv")
+# Tables an uploaded file can be loaded into, with the columns it must provide
+UPLOAD_TARGETS = {
+    "account_weekly_snapshot": {
+        "columns": ["bank", "type", "balance", "payment_due", "last_updated_date"],
+        "dates": ["last_updated_date"],
+        "load": lambda df, **kwargs: load_account_snapshots(prepare_snapshots(df), **kwargs)
+    },
+    "accounts": {
+        "columns": ["bank", "type", "apr", "credit_limit", "due_date_day"],
+        "load": load_accounts
+    }
+}
 
-def normalize_question(question):
-    """Normalize question text for better matching"""
-    if not question:
-        return ""
-    import string
-    normalized = question.strip().lower()
-    normalized = normalized.translate(str.maketrans('', '', string.punctuation))
-    normalized = ' '.join(normalized.split())
-    return normalized
+
+def prepare_sql(sql):
+    """Normalize SQL for execution and apply the rewrite pass for known slow patterns"""
+    sql_lower = sql.lower()
+    return optimize_sql(sql_lower) if SQL_REWRITE else sql_lower
+
+
+def run_select(sql):
+    """Execute a read query, serving repeated SQL from the result cache"""
+    cached = result_cache.get(sql)
+    if cached is not None:
+        logger.debug("Serving query result from cache")
+        return cached
+    generation = result_cache.generation
+    df = guarded_read_sql(
+        engine,
+        sql,
+        max_rows=QUERY_MAX_ROWS,
+        timeout_ms=QUERY_TIMEOUT_MS,
+        max_estimated_rows=QUERY_MAX_ESTIMATED_ROWS
+    )
+    df = df.replace({np.nan: None, np.inf: None, -np.inf: None})
+    result_cache.put(sql, df, generation)
+    return df
 
 
 def get_dynamic_threshold(question1, question2):
@@ -97,14 +357,24 @@ def get_dynamic_threshold(question1, question2):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     try:
-        load_accounts_from_excel("db/accounts.xlsx")
-        load_account_snapshots_from_excel("db/account_weekly_snapshot.xlsx")
+        exact_match_index.rebuild()
+        ensure_derived_tables(engine)
+        load_accounts_from_excel(ACCOUNTS_WORKBOOK)
+        load_account_snapshots_from_excel(SNAPSHOTS_WORKBOOK)
+        if workbook_watcher is not None:
+            workbook_watcher.start()
         initialize_finance_chromadb()
         load_feedback_to_chromadb(client, embedding_fn)
+        prompt_context_cache.invalidate()
         logger.info("Backend and ChromaDB initialized successfully!")
     except Exception as e:
         logger.error(f"Failed to initialize: {e}")
     yield
+    await ollama_client.close()
+    db_executor.shutdown()
+    if workbook_watcher is not None:
+        workbook_watcher.stop()
+    ingestion_jobs.shutdown()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -135,15 +405,40 @@ async def get_questions():
         raise HTTPException(status_code=500, detail=f"Error retrieving questions: {str(e)}")
 
 
-@app.post("/reload_snapshots")
+@app.post("/reload_snapshots", status_code=202)
 async def reload_snapshots():
-    try:
-        load_account_snapshots_from_excel("db/account_weekly_snapshot.xlsx")
-        logger.info("Snapshots reloaded from Excel successfully")
-        return {"message": "Snapshots reloaded from Excel successfully."}
-    except Exception as e:
-        logger.error(f"Failed to reload snapshots: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    """Queue a reload of the snapshot workbook; poll /jobs/{job_id} for the outcome"""
+    job_id = ingestion_jobs.submit(
+        "reload_snapshots", SNAPSHOTS_WORKBOOK, lambda report: reload_workbook_job(SNAPSHOTS_WORKBOOK, report)
+    )
+    return {"message": "Snapshot reload queued.", "job_id": job_id}
+
+
+@app.get("/jobs")
+def list_jobs():
+    """Recent ingestion jobs, newest first"""
+    return {"jobs": ingestion_jobs.list()}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Status of an ingestion job: rows parsed, rows loaded, per-table changes and any error"""
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+
+def accepts_ndjson(request: Request):
+    """True when the client asked for a streamed NDJSON response"""
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def serialize_rows(df, request: Request):
+    """Row records by default; {column: values} when the client accepts the columnar format"""
+    if COLUMNAR_MEDIA_TYPE in request.headers.get("accept", ""):
+        return df.to_dict(orient="list")
+    return df.to_dict(orient="records")
 
 
 @app.get("/tables")
@@ -159,29 +454,163 @@ def get_tables():
 
 
 @app.get("/table/{table_name}")
-def get_table_data(table_name: str):
+def get_table_data(table_name: str, request: Request, limit: Optional[int] = None,
+                   cursor: Optional[str] = None, columns: Optional[str] = None):
+    """
+    Get rows from a table.
+
+    Without limit/cursor the whole table is returned. With them, rows are paged by
+    primary key: pass the returned next_cursor back as cursor for the next page.
+    columns is an optional comma-separated projection.
+    """
+    try:
+        table = get_table(engine, table_name)
+    except NoSuchTableError:
+        raise HTTPException(status_code=404, detail=f"Table not found: {table_name}")
+
+    selected = [c.strip() for c in columns.split(",") if c.strip()] if columns else [c.name for c in table.columns]
+    unknown = [c for c in selected if c not in table.c]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown columns for {table_name}: {unknown}")
+
+    paginate = limit is not None or cursor is not None
+    pk_columns = list(table.primary_key.columns)
+    if paginate and not pk_columns:
+        raise HTTPException(status_code=400, detail=f"Table {table_name} has no primary key to paginate on")
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    page_size = min(limit if limit is not None else TABLE_PAGE_SIZE, TABLE_PAGE_MAX)
+
     try:
-        df = pd.read_sql(f"SELECT * FROM {table_name}", engine)
-        df = df.replace({np.nan: None, np.inf: None, -np.inf: None})
-        logger.debug(f"Retrieved {len(df)} rows from table {table_name}")
-        return {"columns": list(df.columns), "data": df.to_dict(orient="records")}
+        if not paginate:
+            query = select(*[table.c[c] for c in selected])
+            if accepts_ndjson(request):
+                logger.debug(f"Streaming rows from table {table_name}")
+                return StreamingResponse(
+                    stream_query_ndjson(engine, query, batch_size=DB_STREAM_BATCH_SIZE),
+                    media_type=NDJSON_MEDIA_TYPE
+                )
+            with engine.connect() as conn:
+                df = pd.read_sql(query, conn)
+            df = df.replace({np.nan: None, np.inf: None, -np.inf: None})
+            logger.debug(f"Retrieved {len(df)} rows from table {table_name}")
+            return {"columns": list(df.columns), "data": serialize_rows(df, request)}
+
+        # Keyset pagination: the primary key is always fetched to build the next cursor
+        pk_names = [c.name for c in pk_columns]
+        fetched = selected + [name for name in pk_names if name not in selected]
+        query = select(*[table.c[c] for c in fetched]).order_by(*pk_columns).limit(page_size)
+        if cursor:
+            query = query.where(tuple_(*pk_columns) > tuple_(*decode_cursor(cursor, pk_columns)))
+        with engine.connect() as conn:
+            df = pd.read_sql(query, conn)
+
+        next_cursor = encode_cursor(df.iloc[-1][pk_names].tolist()) if len(df) == page_size else None
+        df = df[selected].replace({np.nan: None, np.inf: None, -np.inf: None})
+        logger.debug(f"Retrieved page of {len(df)} rows from table {table_name}")
+        response = {"columns": selected, "data": serialize_rows(df, request), "next_cursor": next_cursor}
+        if not cursor:
+            response["total_count_hint"] = estimate_table_rows(engine, table_name)
+        return response
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to get table data for {table_name}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@app.get("/trends")
+async def get_trends(request: Request, weeks: int = 52):
+    """
+    Weekly net worth, debt and credit utilisation for the most recent weeks
+
+    Served from weekly_account_rollup, so the cost does not grow with snapshot history.
+    """
+    if weeks < 1:
+        raise HTTPException(status_code=400, detail="weeks must be positive")
+    try:
+        df = await db_executor.run(run_select, WEEKLY_TRENDS_SQL.format(weeks=int(weeks)))
+        logger.debug(f"Retrieved {len(df)} weeks of trends")
+        return {"columns": list(df.columns), "data": serialize_rows(df, request)}
+    except Exception as e:
+        logger.error(f"Failed to get trends: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ---------- File upload functionality ----------
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    save_path = os.path.join(UPLOAD_DIR, file.filename)
+def parse_upload(path):
+    """Parse and clean an uploaded workbook or CSV"""
+    if path.lower().endswith(".csv"):
+        return clean_excel_data(pd.read_csv(path))
+    return parse_workbook(path)
+
+
+def detect_upload_table(df):
+    """Name of the table whose columns the upload provides, or None"""
+    for table_name, target in UPLOAD_TARGETS.items():
+        if set(target["columns"]).issubset(df.columns):
+            return table_name
+    return None
+
+
+def ingest_upload(path, table_name, report):
+    """Validate, clean and merge an uploaded file into its table"""
+    df = parse_upload(path)
+    report(rows_parsed=len(df))
+
+    table_name = table_name or detect_upload_table(df)
+    if table_name is None:
+        raise ValueError(f"Columns {list(df.columns)} do not match any table: " + "; ".join(
+            f"{name} needs {target['columns']}" for name, target in UPLOAD_TARGETS.items()
+        ))
+    target = UPLOAD_TARGETS[table_name]
+    missing = [c for c in target["columns"] if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns for {table_name}: {missing}")
+    df = df[target["columns"]].copy()
+    for column in target.get("dates", []):
+        parsed = pd.to_datetime(df[column], format="ISO8601", errors="coerce")
+        unparsed = df[column].notna() & parsed.isna()
+        if unparsed.any():
+            # Report file rows: +1 for the header, +1 for 1-based numbering
+            rows = [f"row {i + 2}: {df.at[i, column]!r}" for i in df.index[unparsed][:10]]
+            raise ValueError(f"Invalid {column} values (expected ISO 8601 dates): {'; '.join(rows)}")
+        df[column] = round_datetimes(parsed.to_frame())[column]
+    invalid_types = sorted(set(df["type"].dropna()) - set(ACCOUNT_TYPES))
+    if invalid_types:
+        raise ValueError(f"Unknown account types {invalid_types}; expected one of {list(ACCOUNT_TYPES)}")
+
+    changes = target["load"](df, delete_missing=False)
+    report(rows_loaded=changes["inserted"] + changes["updated"], changes={table_name: changes})
+
+
+@app.post("/upload", status_code=202)
+async def upload_file(file: UploadFile = File(...), table: Optional[str] = None):
+    """
+    Save an uploaded workbook or CSV and queue a background job that merges it into the database
+
+    The target table is taken from table, or detected from the file's columns.
+    Poll /jobs/{job_id} for rows parsed, rows loaded and errors.
+    """
+    file_name = os.path.basename(file.filename or "")
+    if not file_name.lower().endswith(UPLOAD_EXTENSIONS):
+        raise HTTPException(status_code=400, detail=f"Unsupported file type; expected one of {list(UPLOAD_EXTENSIONS)}")
+    if table is not None and table not in UPLOAD_TARGETS:
+        raise HTTPException(status_code=400, detail=f"Unknown table {table}; expected one of {list(UPLOAD_TARGETS)}")
+
+    save_path = os.path.join(UPLOAD_DIR, file_name)
     try:
         with open(save_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
-        logger.info(f"File '{file.filename}' uploaded successfully to {save_path}")
-        return {"message": f"File '{file.filename}' uploaded successfully.", "path": save_path}
+        logger.info(f"File '{file_name}' uploaded successfully to {save_path}")
     except Exception as e:
-        logger.error(f"Failed to upload file {file.filename}: {e}")
+        logger.error(f"Failed to upload file {file_name}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    job_id = ingestion_jobs.submit(
+        "upload", file_name, lambda report: ingest_upload(save_path, table, report)
+    )
+    return {"message": f"File '{file_name}' uploaded; ingestion queued.", "path": save_path, "job_id": job_id}
+
 # ---------- AI-powered SQL generation ----------
 def load_prompt_template(template_name):
     """Load prompt template from file"""
@@ -194,6 +623,46 @@ def load_prompt_template(template_name):
         raise HTTPException(status_code=500, detail="Prompt template missing")
 
 
+def build_prompt_context():
+    """Fetch the prompt template and the schema, rules, examples and feedback blocks"""
+    schema_collection = client.get_collection("table_schemas")
+    rules_collection = client.get_collection("sql_rules")
+    examples_collection = client.get_collection("query_examples")
+
+    schemas = [d for d in schema_collection.get()["documents"]]
+    rules = [d for d in rules_collection.get()["documents"]]
+    # Embeddings are kept so examples and corrections can be ranked per question
+    example_results = examples_collection.get(include=["documents", "embeddings"])
+
+    # Get user feedback/corrections
+    user_feedbacks = []
+    feedback_embeddings = None
+    complete = True
+    try:
+        feedback_collection = client.get_collection("user_feedback")
+        feedback_results = feedback_collection.get(include=["documents", "embeddings"])
+        user_feedbacks = [d for d in feedback_results["documents"]]
+        feedback_embeddings = feedback_results.get("embeddings")
+    except Exception as e:
+        logger.warning(f"Could not retrieve feedback: {e}")
+        complete = False
+
+    return {
+        "template": load_prompt_template("sql_generation_prompt"),
+        "schemas": chr(10).join(schemas),
+        "rules": chr(10).join(rules),
+        "examples": [d for d in example_results["documents"]],
+        "example_embeddings": example_results.get("embeddings"),
+        "user_feedbacks": user_feedbacks,
+        "feedback_embeddings": feedback_embeddings,
+        "feedback_fallback": "No previous corrections available",
+        "complete": complete
+    }
+
+
+prompt_context_cache = PromptContextCache(build_prompt_context)
+
+
 class QueryRequest(BaseModel):
     question: str
 
@@ -211,244 +680,346 @@ class SmartQueryResponse(BaseModel):
     confidence: str
     sql: str = None
     columns: list = None
-    data: list = None
+    data: Union[list, dict] = None
     error: str = None
+    truncated: bool = False
 
-@app.post("/query", response_model=QueryResponse)
-async def query_to_sql(request: QueryRequest):
-    nl_query = request.question
-    logger.info(f"Processing query: '{nl_query}'")
-    
-    # Track the source of the SQL for feedback storage decisions
-    sql_source = "unknown"
-    confidence = "low"  # Default to low confidence
-    
+def match_good_feedback(feedback_collection, nl_query, query_embedding):
+    """Step 1A: return proven working SQL from GOOD feedback, if similar enough"""
+    logger.debug("STEP 1A: Checking for good feedback...")
     try:
-        # Get user_feedback collection - handle embedding function gracefully
-        try:
-            feedback_collection = client.get_collection("user_feedback")
-            logger.debug("Using existing user_feedback collection")
-        except Exception as e:
-            logger.warning(f"Could not get user_feedback collection: {e}")
-            feedback_collection = None
+        good_results = feedback_collection.query(
+            query_embeddings=[query_embedding],
+            where={"feedback": "good"},
+            n_results=1
+        )
+        
+        if good_results and good_results["documents"] and good_results["documents"][0]:
+            metadata = good_results["metadatas"][0][0]
+            distance = good_results["distances"][0][0] if good_results.get("distances") and good_results["distances"][0] else None
+            
+            logger.debug(f"Found good feedback entry")
+            logger.debug(f"Similarity distance: {distance}")
+            logger.debug(f"Good feedback question: '{metadata.get('question', 'N/A')}'")
+            
+            # Check for exact match with better normalization
+            feedback_question_normalized = normalize_question(metadata.get('question', ''))
+            current_question_normalized = normalize_question(nl_query)
+            is_exact_match = feedback_question_normalized == current_question_normalized
+            
+            logger.debug(f"Normalized good feedback: '{feedback_question_normalized}'")
+            logger.debug(f"Normalized current: '{current_question_normalized}'")
+            logger.debug(f"Good feedback exact match: {is_exact_match}")
+            
+            # Use higher confidence threshold for good queries (0.25 instead of dynamic)
+            good_threshold = 0.25
+            logger.debug(f"Good feedback threshold: {good_threshold}")
+            
+            if (metadata.get("generated_sql") and
+                (is_exact_match or (distance is not None and distance < good_threshold))):
+                logger.info("SOURCE: GOOD_FEEDBACK - Returning proven working SQL")
+                logger.debug(f"Good SQL: {metadata.get('generated_sql')}")
+                return QueryResponse(sql=metadata["generated_sql"], source="good_feedback", confidence="high")
+            else:
+                logger.debug(f"Good feedback not similar enough (distance: {distance}, threshold: {good_threshold})")
+        else:
+            logger.debug("No good feedback entries found")
+            
+    except Exception as e:
+        logger.warning(f"Error querying good feedback: {e}")
+    return None
 
-        # Step 1: Check for GOOD feedback first (proven working queries)
-        logger.debug("STEP 1A: Checking for good feedback...")
-        if feedback_collection:
-            try:
-                good_results = feedback_collection.query(
-                    query_texts=[nl_query],
-                    where={"feedback": "good"},
-                    n_results=1
-                )
-                
-                if good_results and good_results["documents"] and good_results["documents"][0]:
-                    metadata = good_results["metadatas"][0][0]
-                    distance = good_results["distances"][0][0] if good_results.get("distances") and good_results["distances"][0] else None
-                    
-                    logger.debug(f"Found good feedback entry")
-                    logger.debug(f"Similarity distance: {distance}")
-                    logger.debug(f"Good feedback question: '{metadata.get('question', 'N/A')}'")
-                    
-                    # Check for exact match with better normalization
-                    feedback_question_normalized = normalize_question(metadata.get('question', ''))
-                    current_question_normalized = normalize_question(nl_query)
-                    is_exact_match = feedback_question_normalized == current_question_normalized
-                    
-                    logger.debug(f"Normalized good feedback: '{feedback_question_normalized}'")
-                    logger.debug(f"Normalized current: '{current_question_normalized}'")
-                    logger.debug(f"Good feedback exact match: {is_exact_match}")
-                    
-                    # Use higher confidence threshold for good queries (0.25 instead of dynamic)
-                    good_threshold = 0.25
-                    logger.debug(f"Good feedback threshold: {good_threshold}")
-                    
-                    if (metadata.get("generated_sql") and
-                        (is_exact_match or (distance is not None and distance < good_threshold))):
-                        logger.info("SOURCE: GOOD_FEEDBACK - Returning proven working SQL")
-                        logger.debug(f"Good SQL: {metadata.get('generated_sql')}")
-                        sql_source = "good_feedback"
-                        confidence = "high"
-                        return QueryResponse(sql=metadata["generated_sql"], source=sql_source, confidence=confidence)
-                    else:
-                        logger.debug(f"Good feedback not similar enough (distance: {distance}, threshold: {good_threshold})")
-                else:
-                    logger.debug("No good feedback entries found")
-                    
-            except Exception as e:
-                logger.warning(f"Error querying good feedback: {e}")
 
-        # Step 1B: Check for BAD feedback (corrected queries)
-        logger.debug("STEP 1B: Checking for bad feedback corrections...")
-        if feedback_collection:
-            try:
-                bad_results = feedback_collection.query(
-                    query_texts=[nl_query],
-                    where={"feedback": "bad"},
-                    n_results=1
-                )
-                
-                if bad_results and bad_results["documents"] and bad_results["documents"][0]:
-                    metadata = bad_results["metadatas"][0][0]
-                    distance = bad_results["distances"][0][0] if bad_results.get("distances") and bad_results["distances"][0] else None
-                    
-                    logger.debug(f"Found bad feedback entry with corrected_sql: {bool(metadata.get('corrected_sql'))}")
-                    logger.debug(f"Similarity distance: {distance}")
-                    logger.debug(f"Bad feedback question: '{metadata.get('question', 'N/A')}'")
-                    
-                    # Check for exact match with better normalization
-                    feedback_question_normalized = normalize_question(metadata.get('question', ''))
-                    current_question_normalized = normalize_question(nl_query)
-                    is_exact_match = feedback_question_normalized == current_question_normalized
-                    
-                    logger.debug(f"Normalized bad feedback: '{feedback_question_normalized}'")
-                    logger.debug(f"Normalized current: '{current_question_normalized}'")
-                    logger.debug(f"Bad feedback exact match: {is_exact_match}")
-                    
-                    # Calculate dynamic threshold for bad feedback
-                    dynamic_threshold = get_dynamic_threshold(metadata.get('question', ''), nl_query)
-                    logger.debug(f"Bad feedback dynamic threshold: {dynamic_threshold}")
-                    
-                    if (metadata.get("corrected_sql") and
-                        (is_exact_match or (distance is not None and distance < dynamic_threshold))):
-                        logger.info("SOURCE: BAD_FEEDBACK_CORRECTED - Returning corrected SQL from user feedback")
-                        logger.debug(f"Corrected SQL: {metadata.get('corrected_sql')}")
-                        sql_source = "bad_feedback_corrected"
-                        confidence = "high"
-                        return QueryResponse(sql=metadata["corrected_sql"], source=sql_source, confidence=confidence)
-                    else:
-                        if not metadata.get("corrected_sql"):
-                            logger.debug(f"Skipping bad feedback - missing corrected_sql")
-                        elif not is_exact_match and (distance is None or distance >= dynamic_threshold):
-                            logger.debug(f"Skipping bad feedback - not similar enough (distance: {distance}, threshold: {dynamic_threshold})")
-                else:
-                    logger.debug("No bad feedback entries found")
-                    
-            except Exception as e:
-                logger.warning(f"Error querying bad feedback: {e}")
+def match_bad_feedback(feedback_collection, nl_query, query_embedding):
+    """Step 1B: return corrected SQL from BAD feedback, if similar enough"""
+    logger.debug("STEP 1B: Checking for bad feedback corrections...")
+    try:
+        bad_results = feedback_collection.query(
+            query_embeddings=[query_embedding],
+            where={"feedback": "bad"},
+            n_results=1
+        )
+        
+        if bad_results and bad_results["documents"] and bad_results["documents"][0]:
+            metadata = bad_results["metadatas"][0][0]
+            distance = bad_results["distances"][0][0] if bad_results.get("distances") and bad_results["distances"][0] else None
+            
+            logger.debug(f"Found bad feedback entry with corrected_sql: {bool(metadata.get('corrected_sql'))}")
+            logger.debug(f"Similarity distance: {distance}")
+            logger.debug(f"Bad feedback question: '{metadata.get('question', 'N/A')}'")
+            
+            # Check for exact match with better normalization
+            feedback_question_normalized = normalize_question(metadata.get('question', ''))
+            current_question_normalized = normalize_question(nl_query)
+            is_exact_match = feedback_question_normalized == current_question_normalized
+            
+            logger.debug(f"Normalized bad feedback: '{feedback_question_normalized}'")
+            logger.debug(f"Normalized current: '{current_question_normalized}'")
+            logger.debug(f"Bad feedback exact match: {is_exact_match}")
+            
+            # Calculate dynamic threshold for bad feedback
+            dynamic_threshold = get_dynamic_threshold(metadata.get('question', ''), nl_query)
+            logger.debug(f"Bad feedback dynamic threshold: {dynamic_threshold}")
+            
+            if (metadata.get("corrected_sql") and
+                (is_exact_match or (distance is not None and distance < dynamic_threshold))):
+                logger.info("SOURCE: BAD_FEEDBACK_CORRECTED - Returning corrected SQL from user feedback")
+                logger.debug(f"Corrected SQL: {metadata.get('corrected_sql')}")
+                return QueryResponse(sql=metadata["corrected_sql"], source="bad_feedback_corrected", confidence="high")
+            else:
+                if not metadata.get("corrected_sql"):
+                    logger.debug(f"Skipping bad feedback - missing corrected_sql")
+                elif not is_exact_match and (distance is None or distance >= dynamic_threshold):
+                    logger.debug(f"Skipping bad feedback - not similar enough (distance: {distance}, threshold: {dynamic_threshold})")
         else:
-            logger.debug("Feedback collection not available")
+            logger.debug("No bad feedback entries found")
+            
+    except Exception as e:
+        logger.warning(f"Error querying bad feedback: {e}")
+    return None
 
-        # Step 2: Try to find similar examples in query_examples collection
-        logger.debug("STEP 2: Checking query_examples collection...")
-        try:
-            examples_collection = client.get_collection("query_examples")
-            example_results = examples_collection.query(
-                query_texts=[nl_query],
-                n_results=1
-            )
+
+def match_example(nl_query, query_embedding):
+    """Step 2: return SQL from the query_examples collection, if similar enough"""
+    logger.debug("STEP 2: Checking query_examples collection...")
+    try:
+        examples_collection = client.get_collection("query_examples")
+        example_results = examples_collection.query(
+            query_embeddings=[query_embedding],
+            n_results=1
+        )
+        
+        if example_results and example_results["documents"] and example_results["documents"][0]:
+            example_distance = example_results["distances"][0][0] if example_results.get("distances") and example_results["distances"][0] else None
+            example_metadata = example_results["metadatas"][0][0] if example_results["metadatas"][0] else {}
             
-            if example_results and example_results["documents"] and example_results["documents"][0]:
-                example_distance = example_results["distances"][0][0] if example_results.get("distances") and example_results["distances"][0] else None
-                example_metadata = example_results["metadatas"][0][0] if example_results["metadatas"][0] else {}
-                
-                logger.debug(f"Found matching example - distance: {example_distance}")
-                logger.debug(f"Example question: '{example_metadata.get('question', 'N/A')}'")
-                
-                # Check for exact match with better normalization for examples
-                example_question_normalized = normalize_question(example_metadata.get('question', ''))
-                current_question_normalized = normalize_question(nl_query)
-                is_exact_match_example = example_question_normalized == current_question_normalized
-                
-                logger.debug(f"Normalized example: '{example_question_normalized}'")
-                logger.debug(f"Normalized current: '{current_question_normalized}'")
-                logger.debug(f"Example exact match: {is_exact_match_example}")
-                
-                # Calculate dynamic threshold for examples
-                example_dynamic_threshold = get_dynamic_threshold(example_metadata.get('question', ''), nl_query)
-                logger.debug(f"Example dynamic threshold: {example_dynamic_threshold}")
-                
-                if ("sql" in example_metadata and
-                    (is_exact_match_example or (example_distance is not None and example_distance < example_dynamic_threshold))):
-                    logger.info("SOURCE: QUERY_EXAMPLES - Returning SQL from examples collection")
-                    logger.debug(f"Example SQL: {example_metadata['sql']}")
-                    sql_source = "query_examples"
-                    confidence = "high"
-                    return QueryResponse(sql=example_metadata["sql"], source=sql_source, confidence=confidence)
-                else:
-                    if "sql" not in example_metadata:
-                        logger.debug("Example found but no SQL in metadata")
-                    elif not is_exact_match_example and (example_distance is None or example_distance >= example_dynamic_threshold):
-                        logger.debug(f"Skipping example - not similar enough (distance: {example_distance}, threshold: {example_dynamic_threshold})")
+            logger.debug(f"Found matching example - distance: {example_distance}")
+            logger.debug(f"Example question: '{example_metadata.get('question', 'N/A')}'")
+            
+            # Check for exact match with better normalization for examples
+            example_question_normalized = normalize_question(example_metadata.get('question', ''))
+            current_question_normalized = normalize_question(nl_query)
+            is_exact_match_example = example_question_normalized == current_question_normalized
+            
+            logger.debug(f"Normalized example: '{example_question_normalized}'")
+            logger.debug(f"Normalized current: '{current_question_normalized}'")
+            logger.debug(f"Example exact match: {is_exact_match_example}")
+            
+            # Calculate dynamic threshold for examples
+            example_dynamic_threshold = get_dynamic_threshold(example_metadata.get('question', ''), nl_query)
+            logger.debug(f"Example dynamic threshold: {example_dynamic_threshold}")
+            
+            if ("sql" in example_metadata and
+                (is_exact_match_example or (example_distance is not None and example_distance < example_dynamic_threshold))):
+                logger.info("SOURCE: QUERY_EXAMPLES - Returning SQL from examples collection")
+                logger.debug(f"Example SQL: {example_metadata['sql']}")
+                return QueryResponse(sql=example_metadata["sql"], source="query_examples", confidence="high")
             else:
-                logger.debug("No matching examples found")
-                
-        except Exception as e:
-            logger.warning(f"Error querying examples collection: {e}")
+                if "sql" not in example_metadata:
+                    logger.debug("Example found but no SQL in metadata")
+                elif not is_exact_match_example and (example_distance is None or example_distance >= example_dynamic_threshold):
+                    logger.debug(f"Skipping example - not similar enough (distance: {example_distance}, threshold: {example_dynamic_threshold})")
+        else:
+            logger.debug("No matching examples found")
+            
+    except Exception as e:
+        logger.warning(f"Error querying examples collection: {e}")
+    return None
 
-        # Step 3: If no feedback match or example found, proceed to generate SQL from Ollama
-        logger.debug("STEP 3: Generating SQL using Ollama...")
-        schema_collection = client.get_collection("table_schemas")
-        rules_collection = client.get_collection("sql_rules")
-        examples_collection = client.get_collection("query_examples")
 
-        schemas = [d for d in schema_collection.get()["documents"]]
-        rules = [d for d in rules_collection.get()["documents"]]
-        examples = [d for d in examples_collection.get()["documents"]]
+def match_exact_question(nl_query):
+    """Step 0: O(1) exact match on the normalized question - no embedding or ChromaDB call"""
+    exact_match = exact_match_index.lookup(nl_query)
+    if not exact_match:
+        return None
+    sql, sql_source, confidence = exact_match
+    logger.info(f"SOURCE: {sql_source.upper()} - Exact question match from in-memory index")
+    logger.debug(f"Exact match SQL: {sql}")
+    return QueryResponse(sql=sql, source=sql_source, confidence=confidence)
 
-        # Get user feedback/corrections
-        user_feedbacks = []
-        try:
-            feedback_collection = client.get_collection("user_feedback")
-            feedback_results = feedback_collection.get()
-            user_feedbacks = [d for d in feedback_results["documents"]]
-        except Exception as e:
-            logger.warning(f"Could not retrieve feedback: {e}")
-            user_feedbacks = ["No previous corrections available"]
-
-        prompt_template = load_prompt_template("sql_generation_prompt")
-        prompt = prompt_template.format(
-            schemas=chr(10).join(schemas),
-            rules=chr(10).join(rules),
-            examples=chr(10).join(examples),
-            user_feedbacks=chr(10).join(user_feedbacks),
-            nl_query=nl_query
-        )
 
-        logger.debug("Sending request to Ollama...")
-        response = requests.post(
-            OLLAMA_API_URL,
-            json={
-                "model": MODEL_NAME,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "num_ctx": 6144,
-                    "temperature": 0.1,
-                    "top_p": 0.9,
-                    "num_predict": 200
-                }
-            }
-        )
-        response.raise_for_status()
-        full_response = response.json()["response"]
-        logger.info("SOURCE: OLLAMA - Generated SQL using AI model")
-        logger.debug(f"Model Response: {full_response}")
-
-        code_block = re.search(r"```(?:sql)?\s*(.*?)```", full_response, re.DOTALL)
-        if code_block:
-            generated_sql = code_block.group(1).strip()
-        else:
-            fallback = re.search(r"(SELECT\s.+?;)", full_response, re.IGNORECASE | re.DOTALL)
-            if fallback:
-                generated_sql = fallback.group(1).strip()
-            else:
-                raise ValueError("Could not find SQL query in model response.")
+def get_feedback_collection():
+    """Get user_feedback collection - handle embedding function gracefully"""
+    try:
+        feedback_collection = client.get_collection("user_feedback")
+        logger.debug("Using existing user_feedback collection")
+        return feedback_collection
+    except Exception as e:
+        logger.warning(f"Could not get user_feedback collection: {e}")
+        return None
+
+
+def resolve_from_retrieval(nl_query, query_embedding):
+    """Run the feedback and example tiers in order; return the first confident match"""
+    feedback_collection = get_feedback_collection()
+    if feedback_collection:
+        # Step 1: GOOD feedback first (proven working queries), then BAD feedback corrections
+        result = match_good_feedback(feedback_collection, nl_query, query_embedding)
+        if result:
+            return result
+        result = match_bad_feedback(feedback_collection, nl_query, query_embedding)
+        if result:
+            return result
+    else:
+        logger.debug("Feedback collection not available")
+
+    # Step 2: Try to find similar examples in query_examples collection
+    return match_example(nl_query, query_embedding)
+
+
+def build_generation_prompt(nl_query, query_embedding):
+    """Step 3: assemble the token-budgeted prompt for Ollama"""
+    logger.debug("STEP 3: Generating SQL using Ollama...")
+    return build_sql_prompt(
+        prompt_context_cache.get(),
+        nl_query,
+        query_embedding=query_embedding,
+        token_budget=PROMPT_TOKEN_BUDGET,
+        top_k_examples=PROMPT_TOP_K_EXAMPLES,
+        top_k_feedback=PROMPT_TOP_K_FEEDBACK
+    )
+
+
+async def generate_sql(nl_query, query_embedding):
+    """Step 3: generate SQL with Ollama"""
+    # A cold prompt context cache reads ChromaDB, so build the prompt off the event loop
+    prompt = await asyncio.to_thread(build_generation_prompt, nl_query, query_embedding)
+
+    logger.debug("Sending request to Ollama...")
+    full_response = await ollama_client.generate(prompt, options=OLLAMA_OPTIONS)
+    logger.info("SOURCE: OLLAMA - Generated SQL using AI model")
+    logger.debug(f"Model Response: {full_response}")
+
+    generated_sql = extract_sql(full_response)
+    logger.debug(f"Final SQL: {generated_sql}")
+    return QueryResponse(sql=generated_sql, source="ollama_generated", confidence="low")
+
+
+async def resolve_query_speculative(nl_query, query_embedding):
+    """
+    Run all retrieval tiers concurrently and start Ollama at the same time.
+
+    Tier results are still honoured in ladder order (good feedback, bad feedback,
+    examples); the generation is cancelled as soon as one of them is a confident hit.
+    """
+    feedback_collection = await asyncio.to_thread(get_feedback_collection)
+    generation = asyncio.create_task(generate_sql(nl_query, query_embedding))
+    tiers = []
+    if feedback_collection:
+        tiers.append(asyncio.create_task(asyncio.to_thread(match_good_feedback, feedback_collection, nl_query, query_embedding)))
+        tiers.append(asyncio.create_task(asyncio.to_thread(match_bad_feedback, feedback_collection, nl_query, query_embedding)))
+    tiers.append(asyncio.create_task(asyncio.to_thread(match_example, nl_query, query_embedding)))
+
+    try:
+        for tier in tiers:
+            result = await tier
+            if result:
+                logger.info(f"SPECULATIVE: retrieval hit from {result.source} - cancelling Ollama generation")
+                return result
+        return await generation
+    finally:
+        for task in [generation] + tiers:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                # Mark errors of abandoned tasks as retrieved so they are not logged as unhandled
+                task.exception()
+
+
+async def resolve_query(nl_query):
+    """Resolve a question that missed the exact-match index: retrieval tiers, then Ollama"""
+    # Embed the question once and reuse the vector for every lookup below
+    query_embedding = await asyncio.to_thread(embedding_cache.get, nl_query)
+
+    if SPECULATIVE_RESOLUTION:
+        return await resolve_query_speculative(nl_query, query_embedding)
 
-        logger.debug(f"Final SQL: {generated_sql}")
-        sql_source = "ollama_generated"
-        confidence = "low" 
-        return QueryResponse(sql=generated_sql, source=sql_source, confidence=confidence)
+    retrieved = await asyncio.to_thread(resolve_from_retrieval, nl_query, query_embedding)
+    if retrieved:
+        return retrieved
 
-    except requests.exceptions.RequestException as req_err:
+    # Step 3: If no feedback match or example found, proceed to generate SQL from Ollama
+    return await generate_sql(nl_query, query_embedding)
+
+
+@app.post("/query", response_model=QueryResponse)
+async def query_to_sql(request: QueryRequest):
+    nl_query = request.question
+    logger.info(f"Processing query: '{nl_query}'")
+    
+    try:
+        exact_match = match_exact_question(nl_query)
+        if exact_match:
+            return exact_match
+
+        # Identical questions asked concurrently share one in-flight resolution
+        return await query_flights.do(normalize_question(nl_query), lambda: resolve_query(nl_query))
+
+    except httpx.HTTPError as req_err:
         logger.error(f"Ollama request error: {req_err}")
         raise HTTPException(status_code=500, detail=f"Ollama request error: {req_err}")
     except Exception as e:
         logger.error(f"General error in query_to_sql: {e}")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
+
+@app.post("/query/stream")
+async def query_to_sql_stream(request: QueryRequest):
+    """
+    Streaming variant of /query as Server-Sent Events.
+
+    Retrieval hits are sent as a single "result" event. Otherwise Ollama tokens
+    are forwarded as "token" events and the generation is cancelled as soon as
+    a complete SQL statement has been produced, followed by the "result" event.
+    """
+    nl_query = request.question
+    logger.info(f"Processing streaming query: '{nl_query}'")
+
+    def sse_event(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    async def event_stream():
+        try:
+            resolved = match_exact_question(nl_query)
+            if not resolved:
+                query_embedding = await asyncio.to_thread(embedding_cache.get, nl_query)
+                resolved = await asyncio.to_thread(resolve_from_retrieval, nl_query, query_embedding)
+            if resolved:
+                yield sse_event("result", resolved.dict())
+                return
+
+            prompt = await asyncio.to_thread(build_generation_prompt, nl_query, query_embedding)
+            full_response = ""
+            generated_sql = None
+            logger.debug("Streaming request to Ollama...")
+            async with aclosing(ollama_client.stream_generate(prompt, options=OLLAMA_OPTIONS)) as tokens:
+                async for token in tokens:
+                    full_response += token
+                    yield sse_event("token", {"token": token})
+                    generated_sql = find_complete_sql(full_response)
+                    if generated_sql:
+                        # Closing the stream drops the connection, which stops Ollama decoding
+                        logger.debug("Complete SQL received - stopping generation early")
+                        break
+
+            logger.info("SOURCE: OLLAMA - Generated SQL using AI model (streamed)")
+            logger.debug(f"Model Response: {full_response}")
+            if not generated_sql:
+                generated_sql = extract_sql(full_response)
+            logger.debug(f"Final SQL: {generated_sql}")
+            yield sse_event("result", {"sql": generated_sql, "source": "ollama_generated", "confidence": "low"})
+
+        except httpx.HTTPError as req_err:
+            logger.error(f"Ollama request error: {req_err}")
+            yield sse_event("error", {"detail": f"Ollama request error: {req_err}"})
+        except Exception as e:
+            logger.error(f"General error in query_to_sql_stream: {e}")
+            yield sse_event("error", {"detail": f"Unexpected error: {str(e)}"})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.post("/smart_query", response_model=SmartQueryResponse)
-async def smart_query(request: SmartQueryRequest):
+async def smart_query(request: SmartQueryRequest, http_request: Request):
     """
     Smart query endpoint that:
     - For high confidence queries: auto-executes and returns results only
@@ -469,12 +1040,12 @@ async def smart_query(request: SmartQueryRequest):
             logger.info(f"High confidence query - auto-executing SQL from {query_result.source}")
             try:
                 # Execute the SQL
-                sql_lower = query_result.sql.lower()
-                df = pd.read_sql(sql_lower, engine)
-                df = df.replace({np.nan: None, np.inf: None, -np.inf: None})
+                sql_lower = prepare_sql(query_result.sql)
+                df = await db_executor.run(run_select, sql_lower)
                 
                 response.columns = list(df.columns)
-                response.data = df.to_dict(orient="records")
+                response.data = serialize_rows(df, http_request)
+                response.truncated = df.attrs.get("truncated", False)
                 logger.info(f"High confidence query executed successfully, returned {len(df)} rows")
                 
             except Exception as e:
@@ -532,6 +1103,8 @@ async def save_feedback(feedback: FeedbackModel):
         )
 
         save_feedback_to_json(feedback.dict())
+        exact_match_index.add_feedback(feedback.dict())
+        prompt_context_cache.invalidate()
         logger.info(f"Feedback saved successfully for query: '{feedback.question}'")
         return {"message": "Feedback saved successfully."}
     except Exception as e:
@@ -543,18 +1116,35 @@ class SQLQueryRequest(BaseModel):
     sql: str
 
 @app.post("/execute_sql")
-async def execute_sql(query: SQLQueryRequest):
+async def execute_sql(query: SQLQueryRequest, request: Request):
     try:
-        sql_lower = query.sql.lower()
+        sql_lower = prepare_sql(query.sql)
         logger.debug(f"🔍 Executing SQL: {sql_lower}")
-        df = pd.read_sql(sql_lower, engine)
-        df = df.replace({np.nan: None, np.inf: None, -np.inf: None})
+        if accepts_ndjson(request):
+            chunks = await db_executor.run(
+                stream_query_ndjson, engine, sql_lower, batch_size=DB_STREAM_BATCH_SIZE,
+                max_estimated_rows=QUERY_MAX_ESTIMATED_ROWS, timeout_ms=QUERY_TIMEOUT_MS
+            )
+            return StreamingResponse(chunks, media_type=NDJSON_MEDIA_TYPE)
+        df = await db_executor.run(run_select, sql_lower)
         logger.info(f"SQL executed successfully, returned {len(df)} rows")
-        return {"columns": list(df.columns), "data": df.to_dict(orient="records")}
+        return {
+            "columns": list(df.columns),
+            "data": serialize_rows(df, request),
+            "truncated": df.attrs.get("truncated", False)
+        }
     except Exception as e:
         logger.error(f"SQL execution error: {str(e)}")
         raise HTTPException(status_code=400, detail=f"SQL execution error: {str(e)}")
 
+# --------- DB pool metrics ----------
+@app.get("/db_pool")
+def get_db_pool_stats():
+    """Live connection pool statistics"""
+    stats = engine.pool.stats()
+    stats["executor_workers"] = db_executor.max_workers
+    return stats
+
 # --------- LOG_LEVEL ----------
 @app.get("/log_level")
 def get_log_level():
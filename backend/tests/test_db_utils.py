@@ -0,0 +1,85 @@
+"""
+Diff-based loading (sync_table) against the bundled workbooks
+
+Run from backend/: python -m pytest tests
+"""
+import os
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+from utils.db_utils import bulk_insert, round_datetimes, sync_table
+
+DB_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "db")
+SNAPSHOT_KEY = ["bank", "type", "last_updated_date"]
+SNAPSHOT_DDL = """
+CREATE TABLE account_weekly_snapshot (
+    bank VARCHAR(100) NOT NULL,
+    type VARCHAR(20) NOT NULL,
+    balance DECIMAL(10,2) NOT NULL,
+    payment_due DECIMAL(10,2) NOT NULL,
+    last_updated_date DATETIME NOT NULL,
+    PRIMARY KEY (bank, type, last_updated_date)
+)
+"""
+
+
+def read_snapshots():
+    df = pd.read_excel(os.path.join(DB_DIR, "account_weekly_snapshot.xlsx"))
+    df.columns = df.columns.str.strip().str.lower()
+    for column in ("bank", "type"):
+        df[column] = df[column].str.strip()
+    return df
+
+
+@pytest.fixture
+def conn():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text(SNAPSHOT_DDL))
+        yield conn
+
+
+def test_workbook_has_fractional_seconds():
+    # The admin page writes datetime.now(); this is what makes rounding matter
+    assert (read_snapshots()["last_updated_date"].dt.microsecond > 0).any()
+
+
+def test_reloading_unchanged_workbook_writes_nothing(conn):
+    first = sync_table(conn, "account_weekly_snapshot", read_snapshots(), SNAPSHOT_KEY)
+    assert first == {"inserted": 15, "updated": 0, "deleted": 0}
+    assert sync_table(conn, "account_weekly_snapshot", read_snapshots(), SNAPSHOT_KEY) == {
+        "inserted": 0, "updated": 0, "deleted": 0
+    }
+
+
+def test_rows_stored_at_mysql_precision_match_workbook(conn):
+    # MySQL DATETIME keeps whole seconds, rounding the fraction half up
+    stored = read_snapshots()
+    stored["last_updated_date"] = stored["last_updated_date"].dt.ceil("s").where(
+        stored["last_updated_date"].dt.microsecond >= 500000, stored["last_updated_date"].dt.floor("s")
+    )
+    stored.to_sql("account_weekly_snapshot", conn, if_exists="append", index=False)
+    assert sync_table(conn, "account_weekly_snapshot", read_snapshots(), SNAPSHOT_KEY) == {
+        "inserted": 0, "updated": 0, "deleted": 0
+    }
+
+
+def test_round_datetimes_rounds_half_up_to_seconds():
+    df = pd.DataFrame({
+        "when": pd.to_datetime(["2025-06-22 03:49:31.708", "2025-06-22 03:49:30.500", "2025-06-22 03:49:30.499"]),
+        "amount": [1.5, 2.5, 3.5]
+    })
+    rounded = round_datetimes(df)
+    assert list(rounded["when"].astype(str)) == ["2025-06-22 03:49:32", "2025-06-22 03:49:31", "2025-06-22 03:49:30"]
+    assert list(rounded["amount"]) == [1.5, 2.5, 3.5]
+    assert df["when"].dt.microsecond.iloc[0] == 708000
+
+
+def test_bulk_insert_stores_rounded_seconds(conn):
+    df = pd.DataFrame({
+        "bank": ["Bofa"], "type": ["checking"], "balance": [1.0], "payment_due": [0.0],
+        "last_updated_date": pd.to_datetime(["2025-06-22 03:49:31.708"])
+    })
+    bulk_insert(conn, "account_weekly_snapshot", df)
+    stored = conn.execute(text("SELECT last_updated_date FROM account_weekly_snapshot")).scalar()
+    assert str(stored).startswith("2025-06-22 03:49:32")
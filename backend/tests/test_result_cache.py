@@ -0,0 +1,46 @@
+"""
+Result cache keyed by SQL text and data generation
+
+Run from backend/: python -m pytest tests
+"""
+import pandas as pd
+import pytest
+from utils.result_cache import ResultCache, is_cacheable
+
+RESULT = pd.DataFrame({"total": [1250.0]})
+
+
+def test_repeated_sql_is_served_from_cache():
+    cache = ResultCache()
+    sql = "select sum(balance) as total from latest_account_snapshot where type = 'credit';"
+    cache.put(sql, RESULT, cache.generation)
+    assert cache.get(sql) is RESULT
+
+
+def test_reload_invalidates_cached_results():
+    cache = ResultCache()
+    sql = "select * from accounts;"
+    generation = cache.generation
+    cache.bump_generation()
+    cache.put(sql, RESULT, generation)
+    assert cache.get(sql) is None
+
+
+@pytest.mark.parametrize("sql", [
+    "select * from account_weekly_snapshot where last_updated_date >= current_date - interval 30 day;",
+    "select * from account_weekly_snapshot where last_updated_date >= CURDATE() - INTERVAL 1 MONTH;",
+    "select * from account_weekly_snapshot where last_updated_date > now() - interval 7 day;",
+    "select datediff(current_timestamp, max(last_updated_date)) from account_weekly_snapshot;",
+    "select * from accounts order by rand() limit 1;",
+    "select * from accounts where year(last_updated_date) = year(sysdate());",
+])
+def test_time_dependent_sql_is_never_cached(sql):
+    cache = ResultCache()
+    assert not is_cacheable(sql)
+    cache.put(sql, RESULT, cache.generation)
+    assert cache.get(sql) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_column_names_containing_function_names_are_cacheable():
+    assert is_cacheable("select known_balance, random_bucket from accounts;")
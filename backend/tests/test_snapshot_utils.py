@@ -0,0 +1,95 @@
+"""
+Incremental weekly rollup refresh compared with a full recompute
+
+Run from backend/: python -m pytest tests
+"""
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+from utils.db_utils import sync_table
+from utils.snapshot_utils import (
+    ROLLUP_KEY, WEEKLY_ROLLUP_DDL, WEEKLY_ROLLUP_TABLE, compute_weekly_rollup, refresh_weekly_rollup
+)
+
+SNAPSHOT_KEY = ["bank", "type", "last_updated_date"]
+ACCOUNTS = pd.DataFrame({
+    "bank": ["Amex", "Bofa", "Chase"],
+    "type": ["credit", "checking", "credit"],
+    "credit_limit": [6000, None, 600]
+})
+
+
+def weekly_snapshots(weeks=12):
+    """Every account updated on Wednesday of each week, except Chase which stops after week 3"""
+    rows = []
+    for week in range(weeks):
+        day = pd.Timestamp("2025-01-01") + pd.Timedelta(weeks=week)
+        for i, (bank, account_type) in enumerate(zip(ACCOUNTS["bank"], ACCOUNTS["type"])):
+            if bank == "Chase" and week > 3:
+                continue
+            rows.append((bank, account_type, 100.0 * (week + 1) + i, 10.0 * i, day))
+    return pd.DataFrame(rows, columns=["bank", "type", "balance", "payment_due", "last_updated_date"])
+
+
+@pytest.fixture
+def conn():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE accounts (bank TEXT, type TEXT, credit_limit INTEGER, PRIMARY KEY (bank, type))"))
+        conn.execute(text(
+            "CREATE TABLE account_weekly_snapshot (bank TEXT, type TEXT, balance REAL, payment_due REAL, "
+            "last_updated_date DATETIME, PRIMARY KEY (bank, type, last_updated_date))"
+        ))
+        conn.execute(text(WEEKLY_ROLLUP_DDL.replace("ENUM('credit', 'checking', 'stocks', 'crypto')", "TEXT")))
+        ACCOUNTS.to_sql("accounts", conn, if_exists="append", index=False)
+        sync_table(conn, "account_weekly_snapshot", weekly_snapshots(), SNAPSHOT_KEY)
+        refresh_weekly_rollup(conn)
+        yield conn
+
+
+def stored_rollup(conn):
+    df = pd.read_sql(text(f"SELECT * FROM {WEEKLY_ROLLUP_TABLE}"), conn)
+    df["week_start"] = pd.to_datetime(df["week_start"]).dt.date
+    return df.sort_values(ROLLUP_KEY).reset_index(drop=True)
+
+
+def expected_rollup(snapshots):
+    return compute_weekly_rollup(snapshots, ACCOUNTS).sort_values(ROLLUP_KEY).reset_index(drop=True)
+
+
+def apply_change(conn, snapshots):
+    changes = sync_table(conn, "account_weekly_snapshot", snapshots, SNAPSHOT_KEY)
+    since = changes.changed_keys["last_updated_date"].min()
+    return refresh_weekly_rollup(conn, since=since)
+
+
+def test_update_rewrites_only_affected_weeks(conn):
+    snapshots = weekly_snapshots()
+    snapshots.loc[(snapshots["bank"] == "Amex") & (snapshots["last_updated_date"] == "2025-03-05"), "balance"] = 1.0
+    written = apply_change(conn, snapshots)
+    # Amex is updated again the next week, so only the credit row of the week of 2025-03-03 changes
+    assert written == 1
+    pd.testing.assert_frame_equal(stored_rollup(conn), expected_rollup(snapshots), check_dtype=False)
+
+
+def test_carried_forward_balance_counts_from_before_the_change(conn):
+    # Chase stopped updating in week 3; its balance must still be counted in later weeks
+    snapshots = weekly_snapshots()
+    snapshots = snapshots[snapshots["last_updated_date"] != snapshots["last_updated_date"].max()]
+    apply_change(conn, snapshots)
+    pd.testing.assert_frame_equal(stored_rollup(conn), expected_rollup(snapshots), check_dtype=False)
+
+
+def test_backdated_insert_recomputes_from_its_week(conn):
+    snapshots = pd.concat([
+        weekly_snapshots(),
+        pd.DataFrame([("Chase", "credit", 5.0, 1.0, pd.Timestamp("2025-02-14"))], columns=weekly_snapshots().columns)
+    ], ignore_index=True)
+    apply_change(conn, snapshots)
+    pd.testing.assert_frame_equal(stored_rollup(conn), expected_rollup(snapshots), check_dtype=False)
+
+
+def test_unchanged_reload_writes_nothing(conn):
+    changes = sync_table(conn, "account_weekly_snapshot", weekly_snapshots(), SNAPSHOT_KEY)
+    assert not any(changes.values())
+    assert changes.changed_keys.empty
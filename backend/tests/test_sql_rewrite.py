@@ -0,0 +1,86 @@
+"""
+Rewrites of correlated latest-row lookups to latest_account_snapshot
+
+Run from backend/: python -m pytest tests
+"""
+import pytest
+from utils.sql_rewrite import optimize_sql
+
+LATEST = (
+    "(select max(a2.last_updated_date) from account_weekly_snapshot a2 "
+    "where a2.bank = a1.bank and a2.type = a1.type)"
+)
+
+REWRITTEN = [
+    # Examples shipped in chromadb_data/examples.json before latest_account_snapshot existed
+    (
+        "SELECT SUM(balance) as total_credit_card_debt FROM account_weekly_snapshot a1 WHERE type = 'credit' "
+        "AND last_updated_date = (SELECT MAX(last_updated_date) FROM account_weekly_snapshot a2 "
+        "WHERE a2.bank = a1.bank AND a2.type = a1.type);",
+        "SELECT SUM(balance) as total_credit_card_debt FROM latest_account_snapshot a1 WHERE type = 'credit';"
+    ),
+    (
+        "SELECT bank, SUM(balance) as credit_card_debt FROM account_weekly_snapshot a1 WHERE type = 'credit' "
+        "AND last_updated_date = (SELECT MAX(last_updated_date) FROM account_weekly_snapshot a2 "
+        "WHERE a2.bank = a1.bank AND a2.type = a1.type) GROUP BY bank ORDER BY credit_card_debt DESC;",
+        "SELECT bank, SUM(balance) as credit_card_debt FROM latest_account_snapshot a1 WHERE type = 'credit' "
+        "GROUP BY bank ORDER BY credit_card_debt DESC;"
+    ),
+    (
+        f"select sum(balance) as total from account_weekly_snapshot a1 where type = 'credit' "
+        f"and last_updated_date = {LATEST};",
+        "select sum(balance) as total from latest_account_snapshot a1 where type = 'credit';"
+    ),
+    (
+        f"select bank, sum(balance) as debt from account_weekly_snapshot a1 where type = 'credit' "
+        f"and a1.last_updated_date = {LATEST} group by bank order by debt desc limit 1;",
+        "select bank, sum(balance) as debt from latest_account_snapshot a1 where type = 'credit' "
+        "group by bank order by debt desc limit 1;"
+    ),
+    (
+        f"select sum(balance) as net from account_weekly_snapshot a1 where a1.last_updated_date = {LATEST};",
+        "select sum(balance) as net from latest_account_snapshot a1;"
+    ),
+    (
+        f"select bank from account_weekly_snapshot a1 where a1.last_updated_date = {LATEST} and balance > 5000;",
+        "select bank from latest_account_snapshot a1 where balance > 5000;"
+    ),
+    (
+        f"select a1.bank, a.apr from account_weekly_snapshot a1 join accounts a on a.bank = a1.bank "
+        f"and a.type = a1.type where a1.last_updated_date = {LATEST};",
+        "select a1.bank, a.apr from latest_account_snapshot a1 join accounts a on a.bank = a1.bank "
+        "and a.type = a1.type;"
+    ),
+    (
+        f"select (select count(*) from account_weekly_snapshot a1 where a1.last_updated_date = {LATEST}) as n;",
+        "select (select count(*) from latest_account_snapshot a1) as n;"
+    ),
+]
+
+UNCHANGED = [
+    # The subquery is an operand of a larger expression, not a predicate of its own
+    f"select * from account_weekly_snapshot a1 where a1.type = 'credit' and a1.last_updated_date = {LATEST} - interval 7 day;",
+    f"select * from account_weekly_snapshot a1 where a1.type = 'credit' and a1.last_updated_date = {LATEST} + 0 = 1;",
+    f"select * from account_weekly_snapshot a1 where a1.balance > 0 and a1.last_updated_date = {LATEST} is not null;",
+    f"select * from account_weekly_snapshot a1 where a1.last_updated_date = {LATEST} - interval 7 day;",
+    f"select * from account_weekly_snapshot a1 where not a1.last_updated_date = {LATEST};",
+    # OR-ed predicates change meaning when removed
+    f"select * from account_weekly_snapshot a1 where a1.type = 'credit' and a1.last_updated_date = {LATEST} or a1.bank = 'x';",
+    # Extra conditions in the subquery select a different row than the latest one
+    "select * from account_weekly_snapshot a1 where a1.last_updated_date = (select max(a2.last_updated_date) "
+    "from account_weekly_snapshot a2 where a2.bank = a1.bank and a2.type = a1.type and a2.last_updated_date <= '2025-01-01');",
+    # The alias is declared twice, so it is ambiguous which table to replace
+    f"select * from account_weekly_snapshot a1 where a1.last_updated_date = {LATEST} and a1.balance > 0 "
+    "union select * from account_weekly_snapshot a1 where a1.bank = 'x';",
+    "select * from account_weekly_snapshot where bank = 'chase';",
+]
+
+
+@pytest.mark.parametrize("sql, expected", REWRITTEN)
+def test_latest_row_lookup_is_rewritten(sql, expected):
+    assert optimize_sql(sql) == expected
+
+
+@pytest.mark.parametrize("sql", UNCHANGED)
+def test_other_shapes_are_left_alone(sql):
+    assert optimize_sql(sql) == sql
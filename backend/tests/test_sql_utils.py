@@ -0,0 +1,75 @@
+"""
+Finding SQL in complete and partially streamed model responses
+
+Run from backend/: python -m pytest tests
+"""
+import pytest
+from utils.sql_utils import extract_sql, find_complete_sql, statement_end
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("select 1;", 9),
+    ("select 1; select 2;", 9),
+    ("select * from accounts where bank = 'a;b';", 42),
+    ('select * from accounts where bank = "a;b";', 42),
+    ("select `a;b` from accounts;", 27),
+    ("select * from accounts where bank = 'it''s;';", 45),
+    ("select * from accounts where bank = 'it\\'s;';", 45),
+    ("select * from accounts where bank = 'a;", None),
+    ("select * from accounts", None),
+])
+def test_statement_end(text, expected):
+    assert statement_end(text) == expected
+
+
+def test_statement_end_from_offset():
+    text = "x; select 1;"
+    assert statement_end(text, 2) == len(text)
+
+
+@pytest.mark.parametrize("partial", [
+    "```sql\nselect bank from accounts",
+    "```sql\nselect bank from accounts where bank = 'a;",
+    "Here is the query:\nselect bank from accounts",
+    "To find the total we select rows; then add them up.",
+    "To find the total we select rows from the table; then add them up.",
+    "Select the rows; then sum them.",
+    "select 1;",
+])
+def test_incomplete_or_prose_is_not_complete(partial):
+    assert find_complete_sql(partial) is None
+
+
+@pytest.mark.parametrize("partial, expected", [
+    ("```sql\nselect bank from accounts;\n```", "select bank from accounts;"),
+    ("```sql\nselect bank from accounts;", "select bank from accounts;"),
+    ("```\nselect bank from accounts where bank = 'a;b';", "select bank from accounts where bank = 'a;b';"),
+    ("select bank from accounts;", "select bank from accounts;"),
+    ("Here is the query:\n  SELECT bank\nFROM accounts;", "SELECT bank\nFROM accounts;"),
+    (
+        "We select rows; the query is:\nselect sum(balance) from latest_account_snapshot;",
+        "select sum(balance) from latest_account_snapshot;"
+    ),
+])
+def test_complete_sql_is_detected(partial, expected):
+    assert find_complete_sql(partial) == expected
+
+
+def test_prose_semicolon_waits_for_code_block():
+    response = "To find the total we select rows; here it is:\n```sql\nselect sum(balance) from accounts;"
+    assert find_complete_sql(response) == "select sum(balance) from accounts;"
+
+
+@pytest.mark.parametrize("response, expected", [
+    ("Sure:\n```sql\nselect bank from accounts;\n```\nDone.", "select bank from accounts;"),
+    ("Sure:\nselect bank from accounts;\nDone.", "select bank from accounts;"),
+    ("We select rows; the query is:\nselect bank from accounts;", "select bank from accounts;"),
+    ("select 1;", "select 1;"),
+])
+def test_extract_sql(response, expected):
+    assert extract_sql(response) == expected
+
+
+def test_extract_sql_without_sql_raises():
+    with pytest.raises(ValueError):
+        extract_sql("I cannot answer that.")
@@ -0,0 +1,457 @@
+import asyncio
+import base64
+import functools
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+import pandas as pd
+from sqlalchemy import MetaData, Table, create_engine, text
+from sqlalchemy.pool import QueuePool
+from utils.logging_utils import get_logger
+from utils.query_guard import apply_session_guards, check_query_cost, reset_session_guards
+
+logger = get_logger(__name__)
+
+_reflected_tables = {}
+
+
+class MonitoredQueuePool(QueuePool):
+    """QueuePool that records how many callers wait for a connection and for how long"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.waiters = 0
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        with self._stats_lock:
+            self.waiters += 1
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.waiters -= 1
+                self.checkouts += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+
+    def stats(self):
+        return {
+            "pool_size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": self.overflow(),
+            "waiters": self.waiters,
+            "checkouts": self.checkouts,
+            "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3)
+        }
+
+
+def create_db_engine(url, pool_size=5, max_overflow=10, pool_timeout=30, pool_recycle=3600, pool_pre_ping=True,
+                     local_infile=False):
+    """
+    Create the SQLAlchemy engine with an explicitly sized, monitored connection pool
+
+    Args:
+        url (str): Database URL
+        pool_size (int): Connections kept open in the pool
+        max_overflow (int): Extra connections allowed above pool_size under load
+        pool_timeout (int): Seconds to wait for a connection before failing
+        pool_recycle (int): Seconds after which a connection is replaced (-1 disables)
+        pool_pre_ping (bool): Test connections on checkout and replace dead ones
+        local_infile (bool): Allow LOAD DATA LOCAL INFILE on the client side
+
+    Returns:
+        Engine: Engine whose pool exposes stats()
+    """
+    logger.info(
+        f"DB pool: size={pool_size} overflow={max_overflow} timeout={pool_timeout}s "
+        f"recycle={pool_recycle}s pre_ping={pool_pre_ping}"
+    )
+    return create_engine(
+        url,
+        poolclass=MonitoredQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=pool_pre_ping,
+        connect_args={"local_infile": True} if local_infile else {}
+    )
+
+
+class DatabaseExecutor:
+    """
+    Bounded thread pool for blocking database work called from async endpoints
+
+    max_workers caps how many queries or loads run against MySQL at once; extra
+    calls wait in the pool queue without blocking the event loop.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Run a blocking function on the database pool and await its result
+
+        Args:
+            fn (callable): Blocking function, e.g. a pd.read_sql wrapper
+            *args, **kwargs: Passed through to fn
+
+        Returns:
+            The return value of fn
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        logger.debug("Database executor shut down")
+
+
+def json_safe_value(value):
+    """Convert a raw DB value to something json.dumps accepts (NaN/inf become None)"""
+    if isinstance(value, Decimal):
+        value = float(value)
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def stream_query_ndjson(engine, sql, batch_size=1000, max_estimated_rows=0, timeout_ms=0):
+    """
+    Execute a query and stream its rows as NDJSON straight from the DB cursor
+
+    The statement runs before this returns, so SQL errors surface to the caller
+    instead of in the middle of a response. The first line holds the column
+    names; every following line is one row object.
+
+    Args:
+        engine: SQLAlchemy engine
+        sql: Query to execute, as SQL text or a SQLAlchemy statement
+        batch_size (int): Rows fetched from the server-side cursor per batch
+        max_estimated_rows (int): Reject SQL text whose EXPLAIN estimate is higher (0 disables)
+        timeout_ms (int): MySQL MAX_EXECUTION_TIME for the statement (0 disables)
+
+    Returns:
+        generator: NDJSON text chunks, one per batch
+    """
+    conn = engine.connect()
+    guarded = False
+
+    def release():
+        if guarded:
+            reset_session_guards(conn)
+        conn.close()
+
+    try:
+        if isinstance(sql, str):
+            check_query_cost(conn, sql, max_estimated_rows)
+        guarded = apply_session_guards(conn, timeout_ms)
+        streaming_conn = conn.execution_options(stream_results=True)
+        if isinstance(sql, str):
+            result = streaming_conn.exec_driver_sql(sql)
+        else:
+            result = streaming_conn.execute(sql)
+        columns = list(result.keys())
+    except Exception:
+        release()
+        raise
+
+    def chunks():
+        rows_sent = 0
+        try:
+            yield json.dumps({"columns": columns}) + "\n"
+            while True:
+                rows = result.fetchmany(batch_size)
+                if not rows:
+                    break
+                rows_sent += len(rows)
+                yield "".join(
+                    json.dumps({col: json_safe_value(val) for col, val in zip(columns, row)}) + "\n"
+                    for row in rows
+                )
+            logger.debug(f"Streamed {rows_sent} rows")
+        finally:
+            # The server-side cursor must be closed before the session can be reset
+            result.close()
+            release()
+
+    return chunks()
+
+
+def get_table(engine, table_name):
+    """
+    Return the reflected SQLAlchemy Table for a table name, cached per process
+
+    Raises:
+        sqlalchemy.exc.NoSuchTableError: If the table does not exist
+    """
+    table = _reflected_tables.get(table_name)
+    if table is None:
+        table = Table(table_name, MetaData(), autoload_with=engine)
+        _reflected_tables[table_name] = table
+    return table
+
+
+def encode_cursor(values):
+    """Encode primary key values of the last row of a page into an opaque cursor"""
+    payload = json.dumps([json_safe_value(v) for v in values])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor, pk_columns):
+    """
+    Decode a cursor back into primary key values typed for their columns
+
+    Raises:
+        ValueError: If the cursor is malformed or does not match the primary key
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Malformed cursor")
+    if not isinstance(values, list) or len(values) != len(pk_columns):
+        raise ValueError("Cursor does not match the table primary key")
+
+    typed = []
+    for column, value in zip(pk_columns, values):
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            python_type = None
+        if python_type is datetime and isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        elif python_type is date and isinstance(value, str):
+            value = date.fromisoformat(value)
+        typed.append(value)
+    return typed
+
+
+def estimate_table_rows(engine, table_name):
+    """Cheap row count estimate from information_schema (None if unavailable)"""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(
+                text("SELECT TABLE_ROWS FROM information_schema.TABLES "
+                     "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name"),
+                {"table_name": table_name}
+            ).scalar()
+    except Exception as e:
+        logger.debug(f"Row estimate unavailable for {table_name}: {e}")
+        return None
+
+
+def round_datetimes(df):
+    """
+    Round every datetime column to whole seconds, the precision of a MySQL DATETIME
+
+    MySQL rounds fractional seconds half up when storing them; doing the same before
+    diffing or inserting keeps incoming keys equal to the stored ones and makes every
+    load path store the same value.
+
+    Returns:
+        DataFrame: df itself if it has no datetime columns, otherwise a rounded copy
+    """
+    datetime_columns = [c for c in df.columns if pd.api.types.is_datetime64_any_dtype(df[c])]
+    if not datetime_columns:
+        return df
+    df = df.copy()
+    for column in datetime_columns:
+        df[column] = (df[column] + pd.Timedelta(milliseconds=500)).dt.floor("s")
+    return df
+
+
+def _db_rows(df):
+    """DataFrame rows as DB-API parameter dicts of plain Python values (NaN/NaT become NULL)"""
+    values = df.astype(object)
+    for column in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[column]):
+            # numpy converts microsecond datetime64 values to datetime.datetime (NaT to None)
+            values[column] = pd.Series(
+                df[column].to_numpy(dtype="datetime64[us]").astype(object), index=df.index, dtype=object
+            )
+    return values.where(df.notna(), None).to_dict("records")
+
+
+def _comparable(incoming, stored):
+    """Bring an incoming and a stored column to one type so equal values compare equal"""
+    if pd.api.types.is_datetime64_any_dtype(incoming) or pd.api.types.is_datetime64_any_dtype(stored):
+        return pd.to_datetime(incoming, format="ISO8601"), pd.to_datetime(stored, format="ISO8601")
+    if pd.api.types.is_numeric_dtype(incoming) or pd.api.types.is_numeric_dtype(stored):
+        return (
+            pd.to_numeric(incoming, errors="coerce").astype(float).round(6),
+            pd.to_numeric(stored, errors="coerce").astype(float).round(6)
+        )
+    as_text = lambda s: s.map(lambda v: None if v is None or (isinstance(v, float) and math.isnan(v)) else str(v))
+    return as_text(incoming), as_text(stored)
+
+
+def _load_data_local(conn, table_name, df):
+    """Insert df through a temporary CSV and LOAD DATA LOCAL INFILE"""
+    csv_df = df.copy()
+    for column in csv_df.columns:
+        if pd.api.types.infer_dtype(csv_df[column], skipna=True) == "string":
+            # Backslash is the LOAD DATA escape character
+            csv_df[column] = csv_df[column].str.replace("\\", "\\\\", regex=False)
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, newline="") as f:
+        csv_df.to_csv(
+            f, index=False, header=False, na_rep="\\N", date_format="%Y-%m-%d %H:%M:%S", lineterminator="\n"
+        )
+        csv_path = f.name
+    try:
+        conn.exec_driver_sql(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {table_name} "
+            f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' LINES TERMINATED BY '\\n' "
+            f"({', '.join(df.columns)})",
+            (csv_path,)
+        )
+    finally:
+        os.remove(csv_path)
+
+
+def bulk_insert(conn, table_name, df, chunk_size=1000, load_data_local=False):
+    """
+    Insert a DataFrame with multi-row INSERT statements of chunk_size rows
+
+    With load_data_local on MySQL, LOAD DATA LOCAL INFILE is tried first inside a
+    savepoint; if the server or client does not allow it, the multi-row INSERT
+    path is used instead. The achieved rows/second is logged.
+
+    Args:
+        conn: SQLAlchemy connection inside an open transaction
+        table_name (str): Target table
+        df (DataFrame): Rows to insert; column names must match the table
+        chunk_size (int): Rows per INSERT statement
+        load_data_local (bool): Try LOAD DATA LOCAL INFILE first
+
+    Returns:
+        int: Number of rows inserted
+    """
+    if df.empty:
+        return 0
+    started = time.perf_counter()
+    # Both paths must store the same value: LOAD DATA would truncate fractions, INSERT rounds them
+    df = round_datetimes(df)
+    method = None
+    if load_data_local and conn.dialect.name == "mysql":
+        try:
+            with conn.begin_nested():
+                _load_data_local(conn, table_name, df)
+            method = "LOAD DATA LOCAL INFILE"
+        except Exception as e:
+            logger.warning(f"LOAD DATA LOCAL INFILE not available for {table_name}, using multi-row INSERT: {e}")
+
+    if method is None:
+        # pymysql turns each executemany() batch into a single multi-row INSERT ... VALUES
+        statement = text(
+            f"INSERT INTO {table_name} ({', '.join(df.columns)}) VALUES ({', '.join(':' + c for c in df.columns)})"
+        )
+        rows = _db_rows(df)
+        for start in range(0, len(rows), chunk_size):
+            conn.execute(statement, rows[start:start + chunk_size])
+        method = f"multi-row INSERT ({chunk_size} rows per statement)"
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Bulk loaded {len(df)} rows into {table_name} via {method} in {elapsed:.3f}s "
+        f"({len(df) / max(elapsed, 1e-6):,.0f} rows/s)"
+    )
+    return len(df)
+
+
+class TableChanges(dict):
+    """
+    Number of rows sync_table inserted, updated and deleted
+
+    changed_keys holds the key columns of every written row, so callers can
+    limit follow-up work (e.g. derived tables) to what actually changed.
+    """
+
+    def __init__(self, inserted, updated, deleted, changed_keys):
+        super().__init__(inserted=inserted, updated=updated, deleted=deleted)
+        self.changed_keys = changed_keys
+
+
+def sync_table(conn, table_name, df, key_columns, delete_missing=True, chunk_size=1000, load_data_local=False,
+               where=None, params=None):
+    """
+    Make a table hold exactly the rows of df, writing only the differences
+
+    Datetime columns are rounded to whole seconds first (see round_datetimes), so
+    keys read from a workbook match the rows MySQL stored. Rows are matched on
+    key_columns. Keys missing from df are deleted (unless
+    delete_missing is False, which merges df into the table), rows whose values
+    differ are updated and new keys are inserted, all on the caller's connection
+    so the changes commit (or roll back) as one transaction.
+
+    Args:
+        conn: SQLAlchemy connection inside an open transaction
+        table_name (str): Table to synchronize
+        df (DataFrame): Complete desired contents; its columns must exist in the table
+        key_columns (list): Primary key columns
+        delete_missing (bool): Delete stored rows whose key is not in df
+        chunk_size (int): Rows per multi-row INSERT for new keys
+        load_data_local (bool): Try LOAD DATA LOCAL INFILE for new keys first (MySQL only)
+        where (str): SQL condition limiting the stored rows compared with df (and so
+            the rows that may be deleted), e.g. to refresh only part of a table
+        params (dict): Bind parameters for where
+
+    Returns:
+        TableChanges: Number of rows inserted, updated and deleted, with their keys
+    """
+    columns = list(df.columns)
+    value_columns = [c for c in columns if c not in key_columns]
+    select_stored = f"SELECT {', '.join(columns)} FROM {table_name}" + (f" WHERE {where}" if where else "")
+    stored = pd.read_sql(text(select_stored), conn, params=params)
+
+    incoming = round_datetimes(df).reset_index(drop=True)
+    incoming_cmp, stored_cmp = pd.DataFrame(index=incoming.index), pd.DataFrame(index=stored.index)
+    for column in columns:
+        incoming_cmp[column], stored_cmp[column] = _comparable(incoming[column], stored[column])
+    incoming_cmp["_row"] = incoming.index
+    stored_cmp["_row"] = stored.index
+
+    merged = incoming_cmp.merge(stored_cmp, on=key_columns, how="outer", suffixes=("", "_stored"), indicator=True)
+    both = merged[merged["_merge"] == "both"]
+    differs = pd.Series(False, index=both.index)
+    for column in value_columns:
+        new, old = both[column], both[f"{column}_stored"]
+        differs |= (new != old) & ~(new.isna() & old.isna())
+
+    is_deleted = (merged["_merge"] == "right_only") & delete_missing
+    is_updated = merged.index.isin(both.index[differs.to_numpy()])
+    is_inserted = merged["_merge"] == "left_only"
+    deleted = stored.loc[merged.loc[is_deleted, "_row_stored"].astype(int), key_columns]
+    updated = incoming.loc[merged.loc[is_updated, "_row"].astype(int)]
+    inserted = incoming.loc[merged.loc[is_inserted, "_row"].astype(int)]
+
+    key_match = " AND ".join(f"{c} = :{c}" for c in key_columns)
+    if not deleted.empty:
+        conn.execute(text(f"DELETE FROM {table_name} WHERE {key_match}"), _db_rows(deleted))
+    if not updated.empty and value_columns:
+        assignments = ", ".join(f"{c} = :{c}" for c in value_columns)
+        conn.execute(text(f"UPDATE {table_name} SET {assignments} WHERE {key_match}"), _db_rows(updated))
+    if not inserted.empty:
+        bulk_insert(conn, table_name, inserted, chunk_size=chunk_size, load_data_local=load_data_local)
+
+    changed_keys = merged.loc[is_deleted | is_updated | is_inserted, key_columns].reset_index(drop=True)
+    changes = TableChanges(len(inserted), len(updated), len(deleted), changed_keys)
+    logger.info(f"Synchronized {table_name}: {changes}")
+    return changes
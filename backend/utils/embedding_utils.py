@@ -0,0 +1,63 @@
+import threading
+from collections import OrderedDict
+from utils.logging_utils import get_logger
+from utils.question_utils import normalize_question
+
+logger = get_logger(__name__)
+
+
+class EmbeddingCache:
+    """
+    LRU cache of question embeddings keyed by the normalized question text.
+
+    The normalized text is what gets embedded, so two questions that only differ
+    in case, punctuation or whitespace share one vector and one cache entry.
+    """
+
+    def __init__(self, embedding_fn, max_size=512):
+        self.embedding_fn = embedding_fn
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, question):
+        """
+        Return the embedding for a question, computing it at most once per normalized text
+
+        Args:
+            question (str): Raw question text
+
+        Returns:
+            list: Embedding vector usable as a ChromaDB query_embeddings entry
+        """
+        key = normalize_question(question)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        embedding = self.embedding_fn([key or question])[0]
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        logger.debug(f"Embedded question '{key}' (cache size: {len(self._entries)})")
+        return embedding
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses
+        }
@@ -0,0 +1,83 @@
+import json
+import os
+import threading
+from utils.feedback_utils import FEEDBACK_FILE
+from utils.logging_utils import get_logger
+from utils.question_utils import normalize_question
+
+logger = get_logger(__name__)
+
+EXAMPLES_FILE = "chromadb_data/examples.json"
+
+# Same precedence as the /query resolution ladder: good feedback wins over
+# corrected bad feedback, which wins over curated examples
+SOURCE_PRIORITY = {
+    "query_examples": 0,
+    "bad_feedback_corrected": 1,
+    "good_feedback": 2
+}
+
+
+class ExactMatchIndex:
+    """In-memory hash index from normalized question to (sql, source, confidence)"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, question):
+        """
+        Return the indexed (sql, source, confidence) tuple for a question
+
+        Args:
+            question (str): Raw question text
+
+        Returns:
+            tuple or None: (sql, source, confidence) if the normalized question is indexed
+        """
+        return self._entries.get(normalize_question(question))
+
+    def add(self, question, sql, source, confidence="high"):
+        """Index a question unless a higher priority source already owns it"""
+        key = normalize_question(question)
+        if not key or not sql:
+            return False
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing and SOURCE_PRIORITY[existing[1]] > SOURCE_PRIORITY[source]:
+                return False
+            self._entries[key] = (sql, source, confidence)
+        return True
+
+    def add_example(self, example: dict):
+        return self.add(example.get("question"), example.get("sql"), "query_examples")
+
+    def add_feedback(self, feedback: dict):
+        """Index a feedback entry the same way /query would resolve it"""
+        if feedback.get("feedback") == "good":
+            return self.add(feedback.get("question"), feedback.get("generated_sql"), "good_feedback")
+        if feedback.get("feedback") == "bad":
+            return self.add(feedback.get("question"), feedback.get("corrected_sql"), "bad_feedback_corrected")
+        return False
+
+    def rebuild(self, examples_file=EXAMPLES_FILE, feedback_file=FEEDBACK_FILE):
+        """Rebuild the index from examples.json and user_feedback.json"""
+        with self._lock:
+            self._entries = {}
+
+        for path, add_entry in ((examples_file, self.add_example), (feedback_file, self.add_feedback)):
+            if not os.path.exists(path):
+                logger.warning(f"Exact match index source not found: {path}")
+                continue
+            try:
+                with open(path, "r") as f:
+                    for entry in json.load(f):
+                        if isinstance(entry, dict):
+                            add_entry(entry)
+            except Exception as e:
+                logger.warning(f"Could not index questions from {path}: {e}")
+
+        logger.info(f"Exact match index built with {len(self._entries)} questions")
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import threading
+import pandas as pd
+from utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class WorkbookCache:
+    """
+    Parquet cache of parsed and cleaned Excel workbooks
+
+    Entries are keyed by the workbook path and validated against its mtime and
+    size; if those changed but the SHA-256 of the content did not (e.g. the file
+    was touched or copied), the cached frame is still used. Entries written with a
+    different version (i.e. by another revision of the cleaning code) are ignored.
+    Any cache problem (missing pyarrow, unreadable or unwritable cache) falls back
+    to parsing.
+    """
+
+    def __init__(self, cache_dir, version=1):
+        """
+        Args:
+            cache_dir (str): Directory for the Parquet files and manifest
+            version (int): Bump whenever parse changes its output
+        """
+        self.cache_dir = cache_dir
+        self.version = version
+        self.manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable workbook cache manifest: {e}")
+            return {}
+
+    def _save_manifest(self, manifest):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def get(self, path, parse):
+        """
+        Return the cleaned DataFrame for a workbook, parsing it only if it changed
+
+        Args:
+            path (str): Workbook path
+            parse (callable): parse(path) -> DataFrame, used on a cache miss
+
+        Returns:
+            DataFrame: A fresh frame the caller may modify
+        """
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            manifest = self._load_manifest()
+            entry = manifest.get(key)
+            sha256 = None
+            if entry and entry.get("version") == self.version:
+                unchanged = entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size
+                if not unchanged:
+                    sha256 = file_sha256(path)
+                    unchanged = entry["sha256"] == sha256
+                if unchanged:
+                    try:
+                        df = pd.read_parquet(os.path.join(self.cache_dir, entry["file"]))
+                        if sha256:
+                            # Content is the same; remember the new mtime so the next check skips hashing
+                            entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+                            self._save_manifest(manifest)
+                        self.hits += 1
+                        logger.info(f"Loaded {path} from workbook cache ({len(df)} rows)")
+                        return df
+                    except Exception as e:
+                        logger.warning(f"Workbook cache entry for {path} unusable, re-parsing: {e}")
+
+            self.misses += 1
+            df = parse(path)
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                file_name = f"{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}.parquet"
+                tmp_path = os.path.join(self.cache_dir, f"{file_name}.tmp")
+                df.to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, os.path.join(self.cache_dir, file_name))
+                manifest[key] = {
+                    "file": file_name,
+                    "version": self.version,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                    "sha256": sha256 or file_sha256(path)
+                }
+                self._save_manifest(manifest)
+                logger.debug(f"Cached parsed workbook {path} as {file_name}")
+            except Exception as e:
+                logger.warning(f"Could not cache parsed workbook {path}: {e}")
+            return df
+
+    def stats(self):
+        return {"cache_dir": self.cache_dir, "version": self.version, "hits": self.hits, "misses": self.misses}
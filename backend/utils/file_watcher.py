@@ -0,0 +1,106 @@
+import os
+import threading
+from utils.excel_cache import file_sha256
+from utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+def _signature(path):
+    """(mtime_ns, size) of a file, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class WorkbookWatcher:
+    """
+    Polls a set of workbooks and reports each one once it has stopped changing
+
+    A file counts as changed when its mtime or size moves; it is reported only
+    after it has kept the same signature for the debounce window, so a save that
+    writes the file in several steps triggers a single reload. Changes that leave
+    the content identical to the last successful load (e.g. a touch, or a save that
+    was already reloaded explicitly) are skipped by comparing SHA-256 with the hash
+    recorded through mark_loaded. A failed load records nothing, so the next change
+    to the file reports it again.
+    """
+
+    def __init__(self, paths, on_change, interval=2.0, debounce=3.0):
+        """
+        Args:
+            paths (list): Files to watch
+            on_change (callable): on_change(path), called from the watcher thread
+            interval (float): Seconds between polls
+            debounce (float): Seconds a file must stay unchanged before it is reported
+        """
+        self.paths = list(paths)
+        self.on_change = on_change
+        self.interval = interval
+        self.debounce = debounce
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._signatures = {}
+        self._hashes = {}
+        self._pending = {}
+
+    def mark_loaded(self, path, sha256):
+        """Record the content hash of a successful load of path"""
+        with self._lock:
+            self._hashes[path] = sha256
+
+    def loaded_hash(self, path):
+        """SHA-256 of the content last loaded from path, or None"""
+        with self._lock:
+            return self._hashes.get(path)
+
+    def start(self):
+        """Take the current state of every file as loaded and start polling"""
+        for path in self.paths:
+            self._signatures[path] = _signature(path)
+            if self._signatures[path]:
+                self.mark_loaded(path, file_sha256(path))
+        self._thread = threading.Thread(target=self._run, name="workbook-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {', '.join(self.paths)} every {self.interval}s (debounce {self.debounce}s)")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+        logger.debug("Workbook watcher stopped")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for path in self.paths:
+                try:
+                    self._poll(path)
+                except Exception as e:
+                    logger.warning(f"Workbook watcher could not check {path}: {e}")
+
+    def _poll(self, path):
+        signature = _signature(path)
+        if signature != self._signatures[path]:
+            # Still being written; restart the debounce window
+            self._signatures[path] = signature
+            self._pending[path] = 0.0
+            return
+        if path not in self._pending:
+            return
+
+        self._pending[path] += self.interval
+        if self._pending[path] < self.debounce:
+            return
+        del self._pending[path]
+
+        if signature is None:
+            logger.warning(f"Watched workbook {path} was removed; keeping the loaded data")
+            return
+        if file_sha256(path) == self.loaded_hash(path):
+            logger.debug(f"{path} changed on disk but its content is already loaded; skipping reload")
+            return
+        logger.info(f"Detected change to {path}")
+        self.on_change(path)
@@ -0,0 +1,93 @@
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class JobManager:
+    """
+    Runs ingestion work on a background thread pool and tracks its progress
+
+    Jobs run one at a time by default so two loads never race on the same tables.
+    Each job is a dict with its status (queued, running, succeeded, failed), row
+    counters and error; the most recent max_history jobs are kept.
+    """
+
+    def __init__(self, max_workers=1, max_history=100):
+        self.max_history = max_history
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+
+    def submit(self, kind, description, fn):
+        """
+        Queue fn(report) for background execution
+
+        Args:
+            kind (str): Job type, e.g. "upload" or "reload_snapshots"
+            description (str): What is being ingested, e.g. the file name
+            fn (callable): Work to run; receives report(**fields) to publish progress
+                such as rows_parsed, rows_loaded or changes
+
+        Returns:
+            str: Job id
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "kind": kind,
+            "description": description,
+            "status": "queued",
+            "created_at": datetime.utcnow().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "rows_parsed": None,
+            "rows_loaded": None,
+            "changes": None,
+            "error": None
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            while len(self._jobs) > self.max_history:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if oldest["status"] in ("queued", "running"):
+                    break
+                del self._jobs[oldest_id]
+
+        self._executor.submit(self._run, job_id, fn)
+        logger.info(f"Queued {kind} job {job_id} ({description})")
+        return job_id
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _run(self, job_id, fn):
+        self._update(job_id, status="running", started_at=datetime.utcnow().isoformat())
+        try:
+            fn(lambda **fields: self._update(job_id, **fields))
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed: {e}")
+            self._update(job_id, status="failed", error=str(e), finished_at=datetime.utcnow().isoformat())
+            return
+        self._update(job_id, status="succeeded", finished_at=datetime.utcnow().isoformat())
+        logger.info(f"Ingestion job {job_id} finished")
+
+    def get(self, job_id):
+        """Snapshot of a job's state, or None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self):
+        """Snapshots of the tracked jobs, newest first"""
+        with self._lock:
+            return [dict(job) for job in reversed(self._jobs.values())]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        logger.debug("Ingestion job manager shut down")
@@ -0,0 +1,102 @@
+import json
+import httpx
+from utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class OllamaClient:
+    """
+    Pooled async client for the Ollama generate API
+
+    A single httpx.AsyncClient is shared by all requests so connections are kept
+    alive between generations and the event loop is never blocked while the model
+    is decoding.
+    """
+
+    def __init__(self, api_url, model_name, timeout=120.0, connect_timeout=5.0,
+                 max_connections=4, max_keepalive_connections=4, keepalive_expiry=60.0):
+        self.api_url = api_url
+        self.model_name = model_name
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+            logger.debug(f"Created Ollama HTTP client (limits: {self.limits})")
+        return self._client
+
+    async def generate(self, prompt, options=None):
+        """
+        Run a non-streaming generation
+
+        Args:
+            prompt (str): Full prompt text
+            options (dict, optional): Ollama model options
+
+        Returns:
+            str: Model response text
+
+        Raises:
+            httpx.HTTPError: If the request fails or Ollama returns an error status
+        """
+        response = await self.client.post(
+            self.api_url,
+            json={
+                "model": self.model_name,
+                "prompt": prompt,
+                "stream": False,
+                "options": options or {}
+            }
+        )
+        response.raise_for_status()
+        return response.json()["response"]
+
+    async def stream_generate(self, prompt, options=None):
+        """
+        Run a streaming generation, yielding response tokens as they arrive
+
+        Stopping iteration early closes the HTTP response, which makes Ollama
+        abandon the rest of the generation.
+
+        Args:
+            prompt (str): Full prompt text
+            options (dict, optional): Ollama model options
+
+        Yields:
+            str: Response text chunks
+
+        Raises:
+            httpx.HTTPError: If the request fails or Ollama returns an error status
+        """
+        async with self.client.stream(
+            "POST",
+            self.api_url,
+            json={
+                "model": self.model_name,
+                "prompt": prompt,
+                "stream": True,
+                "options": options or {}
+            }
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    break
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
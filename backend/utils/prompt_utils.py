@@ -0,0 +1,156 @@
+import threading
+import numpy as np
+from utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+# Rough characters-per-token ratio for English text and SQL with Llama/Mistral tokenizers
+CHARS_PER_TOKEN = 4
+
+
+class PromptContextCache:
+    """
+    Versioned cache of everything the SQL generation prompt needs besides the question.
+
+    The context is built lazily by the supplied builder and kept until invalidate()
+    is called, which bumps the version so a build that raced with the invalidation
+    is never stored.
+    """
+
+    def __init__(self, builder):
+        self.builder = builder
+        self.version = 0
+        self._context = None
+        self._context_version = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        Return the cached prompt context, building it if missing or stale
+
+        Returns:
+            dict: Context produced by the builder
+        """
+        with self._lock:
+            if self._context is not None and self._context_version == self.version:
+                return self._context
+            version = self.version
+
+        logger.debug(f"Building prompt context (version {version})")
+        context = self.builder()
+
+        with self._lock:
+            # A degraded context (e.g. feedback collection unreachable) is used once but not kept
+            if version == self.version and context.get("complete", True):
+                self._context = context
+                self._context_version = version
+        return context
+
+    def invalidate(self):
+        """Drop the cached context; the next get() rebuilds it"""
+        with self._lock:
+            self.version += 1
+            self._context = None
+        logger.debug(f"Prompt context invalidated (version {self.version})")
+
+
+def estimate_tokens(text):
+    """Cheap token estimate used for prompt budgeting"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def rank_documents(documents, embeddings, query_embedding):
+    """
+    Rank documents by cosine similarity to the question embedding
+
+    Args:
+        documents (list): Document texts
+        embeddings: Stored document embeddings (same order as documents), or None
+        query_embedding: Embedding of the question, or None
+
+    Returns:
+        list: (score, document) tuples, most similar first. Without usable embeddings
+              the original collection order is kept.
+    """
+    if not documents:
+        return []
+    if query_embedding is None or embeddings is None or len(embeddings) != len(documents):
+        return [(-i, doc) for i, doc in enumerate(documents)]
+
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    if matrix.ndim != 2 or matrix.shape[1] != query.shape[0]:
+        logger.warning("Embedding dimensions do not match - keeping collection order")
+        return [(-i, doc) for i, doc in enumerate(documents)]
+
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    scores = matrix @ query / np.where(norms == 0, 1, norms)
+    order = np.argsort(-scores)
+    return [(float(scores[i]), documents[i]) for i in order]
+
+
+def build_sql_prompt(context, nl_query, query_embedding=None, token_budget=4096,
+                     top_k_examples=5, top_k_feedback=5):
+    """
+    Assemble the SQL generation prompt within a token budget
+
+    The template, schema and rules are always included. The remaining budget is
+    filled with the examples and user corrections most similar to the question,
+    at most top_k of each.
+
+    Args:
+        context (dict): Prompt context from PromptContextCache
+        nl_query (str): User question
+        query_embedding: Embedding of the question used for ranking
+        token_budget (int): Maximum estimated prompt tokens
+        top_k_examples (int): Maximum number of examples to include
+        top_k_feedback (int): Maximum number of user corrections to include
+
+    Returns:
+        str: Formatted prompt
+    """
+    fixed_prompt = context["template"].format(
+        schemas=context["schemas"],
+        rules=context["rules"],
+        examples="",
+        user_feedbacks="",
+        nl_query=nl_query
+    )
+    remaining = token_budget - estimate_tokens(fixed_prompt)
+    if remaining <= 0:
+        logger.warning(f"Schema and rules alone exceed the prompt budget of {token_budget} tokens")
+
+    limits = {"examples": top_k_examples, "user_feedbacks": top_k_feedback}
+    candidates = [
+        (score, "examples", doc)
+        for score, doc in rank_documents(context["examples"], context["example_embeddings"], query_embedding)
+    ] + [
+        (score, "user_feedbacks", doc)
+        for score, doc in rank_documents(context["user_feedbacks"], context["feedback_embeddings"], query_embedding)
+    ]
+    candidates.sort(key=lambda c: c[0], reverse=True)
+
+    selected = {"examples": [], "user_feedbacks": []}
+    for score, kind, doc in candidates:
+        if len(selected[kind]) >= limits[kind]:
+            continue
+        cost = estimate_tokens(doc) + 1
+        if cost > remaining:
+            continue
+        selected[kind].append(doc)
+        remaining -= cost
+
+    logger.debug(
+        f"Prompt uses {len(selected['examples'])}/{len(context['examples'])} examples and "
+        f"{len(selected['user_feedbacks'])}/{len(context['user_feedbacks'])} corrections "
+        f"({token_budget - remaining} of {token_budget} estimated tokens)"
+    )
+
+    user_feedbacks = selected["user_feedbacks"] or [context.get("feedback_fallback", "")]
+    return context["template"].format(
+        schemas=context["schemas"],
+        rules=context["rules"],
+        examples=chr(10).join(selected["examples"]),
+        user_feedbacks=chr(10).join(user_feedbacks),
+        nl_query=nl_query
+    )
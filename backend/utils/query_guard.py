@@ -0,0 +1,140 @@
+import pandas as pd
+from utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+EXPLAINABLE_PREFIXES = ("select", "with", "(")
+
+
+class QueryRejected(Exception):
+    """Raised when a query is refused before execution"""
+
+
+def estimate_query_rows(conn, sql):
+    """
+    Estimate how many rows MySQL will examine for a query, from its EXPLAIN plan
+
+    Tables joined within one SELECT multiply; dependent (correlated) subqueries are
+    re-run for every row of the outer query, so they are multiplied by it as well.
+
+    Args:
+        conn: SQLAlchemy connection to MySQL
+        sql (str): Query to estimate
+
+    Returns:
+        int: Rough number of rows examined
+    """
+    plan = conn.exec_driver_sql(f"EXPLAIN {sql}").mappings().all()
+    groups = {}
+    for step in plan:
+        group = groups.setdefault(step.get("id"), {"rows": 1, "dependent": False})
+        group["rows"] *= max(int(step.get("rows") or 1), 1)
+        if "DEPENDENT" in (step.get("select_type") or "").upper():
+            group["dependent"] = True
+
+    outer_rows = groups.get(1, {"rows": 1})["rows"]
+    total = 0
+    for select_id, group in groups.items():
+        if group["dependent"] and select_id != 1:
+            total += group["rows"] * outer_rows
+        else:
+            total += group["rows"]
+    return total
+
+
+def check_query_cost(conn, sql, max_estimated_rows):
+    """
+    Reject a query whose EXPLAIN estimate is above max_estimated_rows (0 disables)
+
+    Only MySQL SELECT/WITH statements are checked.
+
+    Raises:
+        QueryRejected: If the estimate is above the limit
+    """
+    if not max_estimated_rows or conn.dialect.name != "mysql":
+        return
+    if not sql.lstrip().lower().startswith(EXPLAINABLE_PREFIXES):
+        return
+    estimated = estimate_query_rows(conn, sql)
+    logger.debug(f"EXPLAIN estimates {estimated} rows examined")
+    if estimated > max_estimated_rows:
+        logger.warning(f"Rejected query estimated at {estimated} rows (limit {max_estimated_rows})")
+        raise QueryRejected(
+            f"Query rejected: estimated {estimated} rows examined exceeds the limit of {max_estimated_rows}"
+        )
+
+
+def apply_session_guards(conn, timeout_ms=0, max_rows=0):
+    """
+    Set MAX_EXECUTION_TIME and SQL_SELECT_LIMIT for the connection's MySQL session
+
+    A value of 0 leaves the corresponding setting alone; other dialects are untouched.
+    Call reset_session_guards before the connection goes back to the pool.
+
+    Returns:
+        bool: True if any session setting was changed
+    """
+    if conn.dialect.name != "mysql":
+        return False
+    session_settings = []
+    if timeout_ms:
+        session_settings.append(f"MAX_EXECUTION_TIME = {int(timeout_ms)}")
+    if max_rows:
+        session_settings.append(f"SQL_SELECT_LIMIT = {int(max_rows)}")
+    if session_settings:
+        conn.exec_driver_sql(f"SET SESSION {', '.join(session_settings)}")
+    return bool(session_settings)
+
+
+def reset_session_guards(conn):
+    """Restore the session defaults, discarding the connection if that fails"""
+    try:
+        conn.exec_driver_sql("SET SESSION MAX_EXECUTION_TIME = DEFAULT, SQL_SELECT_LIMIT = DEFAULT")
+    except Exception as e:
+        # Never hand a connection with guard settings back to the pool
+        logger.warning(f"Could not reset session guardrails, discarding connection: {e}")
+        conn.invalidate()
+
+
+def guarded_read_sql(engine, sql, max_rows=0, timeout_ms=0, max_estimated_rows=0):
+    """
+    Execute a read query with execution guardrails
+
+    - max_estimated_rows: reject the query up front if EXPLAIN estimates more rows examined
+    - timeout_ms: per-statement MAX_EXECUTION_TIME enforced by MySQL
+    - max_rows: server-side SQL_SELECT_LIMIT; the result is truncated to max_rows
+
+    A value of 0 disables the corresponding guard. The MySQL session settings are
+    reset before the connection goes back to the pool.
+
+    Args:
+        engine: SQLAlchemy engine
+        sql (str): Query to execute
+
+    Returns:
+        DataFrame: Result rows; df.attrs["truncated"] is True when max_rows cut it short
+
+    Raises:
+        QueryRejected: If the estimated cost is above max_estimated_rows
+    """
+    with engine.connect() as conn:
+        check_query_cost(conn, sql, max_estimated_rows)
+
+        # One extra row tells us whether the cap truncated the result
+        guarded = apply_session_guards(conn, timeout_ms, max_rows + 1 if max_rows else 0)
+        try:
+            result = conn.exec_driver_sql(sql)
+            columns = list(result.keys())
+            rows = result.fetchmany(max_rows + 1) if max_rows else result.fetchall()
+            result.close()
+        finally:
+            if guarded:
+                reset_session_guards(conn)
+
+    truncated = bool(max_rows) and len(rows) > max_rows
+    if truncated:
+        logger.warning(f"Query result truncated to {max_rows} rows")
+        rows = rows[:max_rows]
+    df = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+    df.attrs["truncated"] = truncated
+    return df
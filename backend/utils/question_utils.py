@@ -1,10 +1,21 @@
 import json
 import os
+import string
 from typing import List, Dict
 from utils.logging_utils import get_logger
 
 logger = get_logger(__name__)
 
+def normalize_question(question):
+    """Normalize question text for better matching"""
+    if not question:
+        return ""
+    normalized = question.strip().lower()
+    normalized = normalized.translate(str.maketrans('', '', string.punctuation))
+    normalized = ' '.join(normalized.split())
+    return normalized
+
+
 def get_all_questions() -> List[Dict[str, str]]:
     """
     Extract all questions from examples.json and user_feedback.json
@@ -0,0 +1,111 @@
+import re
+import threading
+from collections import OrderedDict
+from utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+# Functions whose value changes without any table changing; results that use them
+# are only valid at the moment they were read
+NONDETERMINISTIC_SQL = re.compile(
+    r"\b(?:current_date|current_time|current_timestamp|curdate|curtime|now|sysdate|"
+    r"utc_date|utc_time|utc_timestamp|localtime|localtimestamp|unix_timestamp|rand|uuid|uuid_short)\b",
+    re.IGNORECASE
+)
+
+
+def is_cacheable(sql):
+    """
+    Whether a statement's result depends only on table contents
+
+    Args:
+        sql (str): SQL text as executed
+
+    Returns:
+        bool: False if the statement calls a time-dependent or random function
+    """
+    return not NONDETERMINISTIC_SQL.search(sql)
+
+
+class ResultCache:
+    """
+    Size-bounded LRU cache of query results keyed by SQL text and data generation
+
+    The data generation is advanced whenever the underlying tables are reloaded,
+    so results read before a reload can never be served after it. Statements that
+    call time-dependent or random functions (see is_cacheable) are never cached.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.generation = 0
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sql):
+        """
+        Return the cached DataFrame for a SQL statement in the current generation
+
+        Args:
+            sql (str): SQL text as executed
+
+        Returns:
+            DataFrame or None: Cached result, or None on a miss
+        """
+        if not is_cacheable(sql):
+            return None
+        with self._lock:
+            key = (self.generation, sql)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, sql, df, generation):
+        """
+        Cache a result read during the given data generation
+
+        Args:
+            sql (str): SQL text as executed
+            df (DataFrame): Result to cache
+            generation (int): Value of self.generation captured before the query ran
+        """
+        if not is_cacheable(sql):
+            return
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            if generation != self.generation or size > self.max_bytes:
+                return
+            key = (generation, sql)
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (df, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def bump_generation(self):
+        """Advance the data generation and drop every cached result"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self.total_bytes = 0
+        logger.debug(f"Data generation advanced to {self.generation}")
+        return self.generation
+
+    def stats(self):
+        return {
+            "generation": self.generation,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses
+        }
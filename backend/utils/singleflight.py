@@ -0,0 +1,44 @@
+import asyncio
+from utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one in-flight execution
+
+    The first caller for a key starts the work; callers arriving while it is
+    still running await the same task and receive the same result or exception.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def do(self, key, fn):
+        """
+        Run fn() once per key at a time and share its outcome
+
+        Args:
+            key (str): Coalescing key
+            fn (callable): Zero-argument function returning a coroutine
+
+        Returns:
+            The result of fn()
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            logger.debug(f"Joining in-flight resolution for '{key}'")
+        # Shield so one caller disconnecting does not cancel the work for the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def __len__(self):
+        return len(self._inflight)
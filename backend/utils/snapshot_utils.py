@@ -0,0 +1,226 @@
+import pandas as pd
+from sqlalchemy import text
+from utils.db_utils import sync_table
+from utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+LATEST_SNAPSHOT_TABLE = "latest_account_snapshot"
+WEEKLY_ROLLUP_TABLE = "weekly_account_rollup"
+LATEST_SNAPSHOT_KEY = ["bank", "type"]
+ROLLUP_KEY = ["week_start", "type"]
+ROLLUP_VALUES = ["total_balance", "total_payment_due", "total_credit_limit", "account_count"]
+
+# Mirror db/init.sql so databases created before these tables existed pick them up
+LATEST_SNAPSHOT_DDL = f"""
+CREATE TABLE IF NOT EXISTS {LATEST_SNAPSHOT_TABLE} (
+    bank VARCHAR(100) NOT NULL,
+    type ENUM('credit', 'checking', 'stocks', 'crypto') NOT NULL,
+    balance DECIMAL(10,2) NOT NULL,
+    payment_due DECIMAL(10,2) NOT NULL,
+    last_updated_date DATETIME NOT NULL,
+    PRIMARY KEY (bank, type),
+    FOREIGN KEY (bank, type) REFERENCES accounts(bank, type) ON DELETE CASCADE
+)
+"""
+
+WEEKLY_ROLLUP_DDL = f"""
+CREATE TABLE IF NOT EXISTS {WEEKLY_ROLLUP_TABLE} (
+    week_start DATE NOT NULL,
+    type ENUM('credit', 'checking', 'stocks', 'crypto') NOT NULL,
+    total_balance DECIMAL(14,2) NOT NULL,
+    total_payment_due DECIMAL(14,2) NOT NULL,
+    total_credit_limit BIGINT NOT NULL,
+    account_count INTEGER NOT NULL,
+    PRIMARY KEY (week_start, type)
+)
+"""
+
+LATEST_SNAPSHOT_SQL = """
+SELECT bank, type, balance, payment_due, last_updated_date
+FROM (
+    SELECT bank, type, balance, payment_due, last_updated_date,
+           ROW_NUMBER() OVER (PARTITION BY bank, type ORDER BY last_updated_date DESC) AS rn
+    FROM account_weekly_snapshot
+) ranked
+WHERE rn = 1
+"""
+
+# Snapshots from :since on, plus each account's last snapshot before it to carry its balance forward.
+# MAX per (bank, type) is answered from the primary key index, so this does not scan older history.
+ROLLUP_SNAPSHOTS_SINCE_SQL = """
+SELECT bank, type, balance, payment_due, last_updated_date
+FROM account_weekly_snapshot
+WHERE last_updated_date >= :since
+UNION ALL
+SELECT s.bank, s.type, s.balance, s.payment_due, s.last_updated_date
+FROM account_weekly_snapshot s
+JOIN (
+    SELECT bank, type, MAX(last_updated_date) AS last_updated_date
+    FROM account_weekly_snapshot
+    WHERE last_updated_date < :since
+    GROUP BY bank, type
+) carried ON s.bank = carried.bank AND s.type = carried.type AND s.last_updated_date = carried.last_updated_date
+"""
+
+# Most recent weeks first in the inner query so LIMIT keeps the latest ones
+WEEKLY_TRENDS_SQL = f"""
+SELECT week_start, total_assets, total_debt, total_assets - total_debt AS net_worth,
+       total_credit_limit, total_payment_due,
+       CASE WHEN total_credit_limit > 0 THEN ROUND(total_debt * 100.0 / total_credit_limit, 2) END AS credit_utilization
+FROM (
+    SELECT week_start,
+           SUM(CASE WHEN type IN ('checking', 'stocks', 'crypto') THEN total_balance ELSE 0 END) AS total_assets,
+           SUM(CASE WHEN type = 'credit' THEN total_balance ELSE 0 END) AS total_debt,
+           SUM(CASE WHEN type = 'credit' THEN total_credit_limit ELSE 0 END) AS total_credit_limit,
+           SUM(total_payment_due) AS total_payment_due
+    FROM {WEEKLY_ROLLUP_TABLE}
+    GROUP BY week_start
+    ORDER BY week_start DESC
+    LIMIT {{weeks}}
+) recent
+ORDER BY week_start
+"""
+
+
+def ensure_derived_tables(engine):
+    """Create latest_account_snapshot and weekly_account_rollup if they do not exist yet"""
+    with engine.begin() as conn:
+        conn.execute(text(LATEST_SNAPSHOT_DDL))
+        conn.execute(text(WEEKLY_ROLLUP_DDL))
+
+
+def refresh_latest_snapshot(conn):
+    """
+    Bring latest_account_snapshot in line with account_weekly_snapshot, writing only accounts that changed
+
+    Runs on the caller's connection so the refresh commits (or rolls back) together
+    with the snapshot load that triggered it.
+
+    Args:
+        conn: SQLAlchemy connection inside an open transaction
+
+    Returns:
+        int: Number of accounts inserted, updated or deleted
+    """
+    latest = pd.read_sql(text(LATEST_SNAPSHOT_SQL), conn)
+    changes = sync_table(conn, LATEST_SNAPSHOT_TABLE, latest, LATEST_SNAPSHOT_KEY)
+    return sum(changes.values())
+
+
+def monday_of(timestamp):
+    """Monday 00:00 of the week containing timestamp"""
+    timestamp = pd.Timestamp(timestamp).normalize()
+    return timestamp - pd.Timedelta(days=timestamp.weekday())
+
+
+def derived_tables_need_backfill(conn):
+    """True if snapshots exist but a derived table is still empty, e.g. because it was created after the data"""
+    has_rows = lambda table: conn.execute(text(f"SELECT 1 FROM {table} LIMIT 1")).first() is not None
+    return has_rows("account_weekly_snapshot") and not (has_rows(LATEST_SNAPSHOT_TABLE) and has_rows(WEEKLY_ROLLUP_TABLE))
+
+
+def compute_weekly_rollup(snapshots, accounts, first_week=None):
+    """
+    Aggregate snapshots into per-week, per-type totals
+
+    Weeks start on Monday. Every account contributes its latest snapshot taken
+    before the end of the week, so an account that was not updated that week
+    still counts with its last known balance.
+
+    Args:
+        snapshots (DataFrame): bank, type, balance, payment_due, last_updated_date
+        accounts (DataFrame): bank, type, credit_limit
+        first_week (Timestamp): Only compute weeks starting on or after this Monday;
+            earlier snapshots then only carry balances forward into it
+
+    Returns:
+        DataFrame: ROLLUP_KEY + ROLLUP_VALUES columns, one row per week and type
+    """
+    if snapshots.empty:
+        return pd.DataFrame(columns=ROLLUP_KEY + ROLLUP_VALUES)
+
+    snapshots = snapshots.assign(last_updated_date=pd.to_datetime(snapshots["last_updated_date"], format="ISO8601"))
+    snapshot_days = snapshots["last_updated_date"].dt.normalize()
+    earliest_week = (snapshot_days - pd.to_timedelta(snapshot_days.dt.weekday, unit="D")).min()
+    first_week = earliest_week if first_week is None else max(earliest_week, first_week)
+    weeks = pd.DataFrame({"week_start": pd.date_range(first_week, snapshot_days.max(), freq="7D")})
+    weeks["week_end"] = weeks["week_start"] + pd.Timedelta(days=7)
+
+    grid = weeks.merge(snapshots[["bank", "type"]].drop_duplicates(), how="cross")
+    as_of_week = pd.merge_asof(
+        grid.sort_values("week_end"),
+        snapshots.sort_values("last_updated_date"),
+        left_on="week_end",
+        right_on="last_updated_date",
+        by=["bank", "type"],
+        direction="backward",
+        allow_exact_matches=False
+    ).dropna(subset=["last_updated_date"])
+
+    limits = accounts[["bank", "type", "credit_limit"]]
+    as_of_week = as_of_week.merge(limits, on=["bank", "type"], how="left")
+    as_of_week["credit_limit"] = as_of_week["credit_limit"].fillna(0)
+
+    rollup = as_of_week.groupby(ROLLUP_KEY, as_index=False).agg(
+        total_balance=("balance", "sum"),
+        total_payment_due=("payment_due", "sum"),
+        total_credit_limit=("credit_limit", "sum"),
+        account_count=("bank", "size")
+    )
+    rollup[["total_balance", "total_payment_due"]] = rollup[["total_balance", "total_payment_due"]].astype(float).round(2)
+    rollup["total_credit_limit"] = rollup["total_credit_limit"].astype("int64")
+    rollup["week_start"] = rollup["week_start"].dt.date
+    return rollup
+
+
+def refresh_weekly_rollup(conn, since=None):
+    """
+    Recompute weekly_account_rollup and store the weeks that changed
+
+    With since, only weeks from the one containing since onwards are recomputed
+    (and may be rewritten or deleted); earlier weeks cannot be affected by
+    snapshots at or after since and are left alone, so the cost of a load does
+    not grow with the length of the history.
+
+    Args:
+        conn: SQLAlchemy connection inside an open transaction
+        since (Timestamp): Earliest last_updated_date that changed (None recomputes every week)
+
+    Returns:
+        int: Number of (week, type) rows inserted, updated or deleted
+    """
+    accounts = pd.read_sql(text("SELECT bank, type, credit_limit FROM accounts"), conn)
+    if since is None:
+        snapshots = pd.read_sql(
+            text("SELECT bank, type, balance, payment_due, last_updated_date FROM account_weekly_snapshot"), conn
+        )
+        rollup = compute_weekly_rollup(snapshots, accounts)
+        changes = sync_table(conn, WEEKLY_ROLLUP_TABLE, rollup, ROLLUP_KEY)
+    else:
+        first_week = monday_of(since)
+        snapshots = pd.read_sql(text(ROLLUP_SNAPSHOTS_SINCE_SQL), conn, params={"since": first_week.to_pydatetime()})
+        rollup = compute_weekly_rollup(snapshots, accounts, first_week=first_week)
+        changes = sync_table(
+            conn, WEEKLY_ROLLUP_TABLE, rollup, ROLLUP_KEY,
+            where="week_start >= :first_week", params={"first_week": first_week.date()}
+        )
+        logger.debug(f"Recomputed {WEEKLY_ROLLUP_TABLE} from week {first_week.date()}")
+    return sum(changes.values())
+
+
+def refresh_derived_tables(conn, since=None):
+    """
+    Bring latest_account_snapshot and weekly_account_rollup in line with account_weekly_snapshot
+
+    Both are diffed, so nothing is written when the snapshots did not change.
+
+    Args:
+        conn: SQLAlchemy connection inside an open transaction
+        since (Timestamp): Earliest last_updated_date that changed; the rollup is only
+            recomputed from its week on (None recomputes every week)
+
+    Returns:
+        int: Number of derived rows inserted, updated or deleted
+    """
+    return refresh_latest_snapshot(conn) + refresh_weekly_rollup(conn, since=since)
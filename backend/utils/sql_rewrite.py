@@ -0,0 +1,151 @@
+import re
+from utils.logging_utils import get_logger
+from utils.snapshot_utils import LATEST_SNAPSHOT_TABLE
+
+logger = get_logger(__name__)
+
+IDENTIFIER = r"[a-z_][a-z0-9_]*"
+
+# <outer>.last_updated_date = (SELECT MAX(<inner>.last_updated_date) FROM account_weekly_snapshot <inner>
+#                               WHERE <inner>.bank = <outer>.bank AND <inner>.type = <outer>.type)
+LATEST_ROW_PREDICATE = re.compile(
+    rf"""
+    (?:`?(?P<outer>{IDENTIFIER})`?\.)?`?last_updated_date`?\s*=\s*
+    \(\s*select\s+max\s*\(\s*(?:`?{IDENTIFIER}`?\.)?`?last_updated_date`?\s*\)\s+
+    from\s+`?account_weekly_snapshot`?(?:\s+(?:as\s+)?`?(?P<inner>{IDENTIFIER})`?)?\s+
+    where\s+(?P<conditions>[^()]*?)\s*\)
+    """,
+    re.IGNORECASE | re.VERBOSE
+)
+JOIN_CONDITION = re.compile(
+    rf"^`?({IDENTIFIER})`?\.`?(bank|type)`?\s*=\s*`?({IDENTIFIER})`?\.`?(bank|type)`?$",
+    re.IGNORECASE
+)
+CLAUSE_END = re.compile(r"\b(?:group\s+by|order\s+by|having|limit|union|window)\b|[);]|$", re.IGNORECASE)
+CLAUSE_START = re.compile(r"\b(?:where|on)\b", re.IGNORECASE)
+OR_KEYWORD = re.compile(r"\bor\b", re.IGNORECASE)
+# What may directly follow a removable predicate: the next AND-ed condition, the end of
+# its clause or statement, or the next join. Anything else (e.g. "- interval 7 day",
+# "+ 0 = 1", "is not null") means the subquery is an operand of a larger expression.
+PREDICATE_BOUNDARY = re.compile(
+    r"\s*(?:$|[);]|(?:and|or|group\s+by|order\s+by|having|limit|union|window|where"
+    r"|join|inner|left|right|cross|natural|straight_join)\b)",
+    re.IGNORECASE
+)
+
+
+def _outer_alias(match):
+    """
+    Work out which alias the correlated subquery filters, or None if the
+    subquery is not exactly "same bank and type as the outer row"
+    """
+    inner = (match.group("inner") or "account_weekly_snapshot").lower()
+    conditions = re.split(r"\s+and\s+", match.group("conditions").strip(), flags=re.IGNORECASE)
+    if len(conditions) != 2:
+        return None
+
+    outer = match.group("outer").lower() if match.group("outer") else None
+    matched_columns = set()
+    for condition in conditions:
+        parts = JOIN_CONDITION.match(condition.strip())
+        if not parts:
+            return None
+        left_alias, left_column, right_alias, right_column = (p.lower() for p in parts.groups())
+        if left_column != right_column:
+            return None
+        if left_alias == inner:
+            other = right_alias
+        elif right_alias == inner:
+            other = left_alias
+        else:
+            return None
+        if other == inner or (outer and other != outer):
+            return None
+        outer = other
+        matched_columns.add(left_column)
+
+    return outer if matched_columns == {"bank", "type"} else None
+
+
+def _remove_predicate(sql, start, end):
+    """
+    Drop a top-level AND-ed predicate from its WHERE/ON clause
+
+    Returns:
+        str or None: SQL without the predicate, or None if it cannot be removed safely
+    """
+    before, after = sql[:start], sql[end:]
+    if not PREDICATE_BOUNDARY.match(after):
+        return None
+    clause_rest = after[:CLAUSE_END.search(after).start()]
+    clause_starts = list(CLAUSE_START.finditer(before))
+    clause_start = clause_starts[-1].start() if clause_starts else 0
+    if OR_KEYWORD.search(before[clause_start:]) or OR_KEYWORD.search(clause_rest):
+        return None
+
+    preceding_and = re.search(r"\band\s*$", before, re.IGNORECASE)
+    if preceding_and:
+        return before[:preceding_and.start()].rstrip() + after
+
+    clause_keyword = re.search(r"\b(where|on)\s*$", before, re.IGNORECASE)
+    if not clause_keyword:
+        return None
+    following_and = re.match(r"\s*and\s+", after, re.IGNORECASE)
+    if following_and:
+        return before + after[following_and.end():]
+    if clause_keyword.group(1).lower() == "where" and not clause_rest.strip():
+        return before[:clause_keyword.start()].rstrip() + after
+    return None
+
+
+def _rewrite_latest_row_lookup(sql, match):
+    """Point the outer alias at latest_account_snapshot and drop the correlated predicate"""
+    outer = _outer_alias(match)
+    if not outer:
+        return None
+
+    without_predicate = _remove_predicate(sql, match.start(), match.end())
+    if without_predicate is None:
+        return None
+
+    declaration = re.compile(
+        rf"\b(from|join)(\s+)`?account_weekly_snapshot`?(\s+(?:as\s+)?`?{re.escape(outer)}`?)(?![a-z0-9_])",
+        re.IGNORECASE
+    )
+    if len(declaration.findall(without_predicate)) != 1:
+        return None
+    return declaration.sub(rf"\1\2{LATEST_SNAPSHOT_TABLE}\3", without_predicate)
+
+
+def optimize_sql(sql):
+    """
+    Rewrite known slow query patterns before execution
+
+    Correlated "latest row per account" lookups, i.e.
+    ``aws.last_updated_date = (SELECT MAX(last_updated_date) FROM account_weekly_snapshot a2
+    WHERE a2.bank = aws.bank AND a2.type = aws.type)``, are answered by reading
+    latest_account_snapshot instead, which holds exactly those rows. A pattern is only
+    rewritten when the predicate is AND-ed into its clause; anything else is left as is.
+
+    Args:
+        sql (str): SQL about to be executed
+
+    Returns:
+        str: Equivalent SQL, rewritten where a pattern matched
+    """
+    rewritten = sql
+    position = 0
+    while True:
+        match = LATEST_ROW_PREDICATE.search(rewritten, position)
+        if not match:
+            break
+        result = _rewrite_latest_row_lookup(rewritten, match)
+        if result is None:
+            position = match.end()
+        else:
+            rewritten = result
+            position = 0
+
+    if rewritten != sql:
+        logger.info(f"Rewrote correlated latest-row lookup\n  original:  {sql}\n  rewritten: {rewritten}")
+    return rewritten
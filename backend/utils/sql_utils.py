@@ -0,0 +1,114 @@
+import re
+
+CODE_BLOCK_PATTERN = re.compile(r"```(?:sql)?\s*(.*?)```", re.DOTALL)
+SELECT_START_PATTERN = re.compile(r"SELECT\s", re.IGNORECASE)
+# A bare statement while streaming: SELECT opening the response or a line, reading FROM a table
+STATEMENT_START_PATTERN = re.compile(r"^[ \t]*(SELECT\s)", re.IGNORECASE | re.MULTILINE)
+FROM_PATTERN = re.compile(r"\bFROM\b", re.IGNORECASE)
+OPEN_CODE_BLOCK_PATTERN = re.compile(r"```(?:sql)?\s*", re.IGNORECASE)
+QUOTES = "'\"`"
+
+
+def statement_end(text, start=0):
+    """
+    Index just past the first ';' at or after start that is not inside a quoted string
+
+    Quotes are ', " or `; a doubled quote or a backslash escapes the next character.
+
+    Returns:
+        int or None: End of the statement, or None if no terminating ';' has arrived yet
+    """
+    quote = None
+    i = start
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if char == "\\":
+                i += 1
+            elif char == quote:
+                if text[i + 1:i + 2] == quote:
+                    i += 1
+                else:
+                    quote = None
+        elif char in QUOTES:
+            quote = char
+        elif char == ";":
+            return i + 1
+        i += 1
+    return None
+
+
+def _select_statement(text):
+    """The first SELECT ...; statement in text, or None"""
+    select_start = SELECT_START_PATTERN.search(text)
+    if not select_start:
+        return None
+    end = statement_end(text, select_start.start())
+    return text[select_start.start():end].strip() if end else None
+
+
+def _bare_statement(text):
+    """
+    The first terminated SELECT ... FROM ...; that starts the response or a line, or None
+
+    Prose such as "we select rows; then ..." does not qualify, so the caller keeps
+    waiting for a code block or the end of the stream instead.
+    """
+    for select_start in STATEMENT_START_PATTERN.finditer(text):
+        start = select_start.start(1)
+        end = statement_end(text, start)
+        if end is None:
+            return None
+        statement = text[start:end].strip()
+        if FROM_PATTERN.search(statement):
+            return statement
+    return None
+
+
+def extract_sql(model_response):
+    """
+    Pull the SQL statement out of a model response
+
+    Args:
+        model_response (str): Full text returned by the model
+
+    Returns:
+        str: SQL from the first ```sql block, else the first SELECT ... FROM ...; on its
+            own line, else the first SELECT ...; anywhere in the text
+
+    Raises:
+        ValueError: If no SQL can be found
+    """
+    code_block = CODE_BLOCK_PATTERN.search(model_response)
+    if code_block:
+        return code_block.group(1).strip()
+    fallback = _bare_statement(model_response) or _select_statement(model_response)
+    if fallback:
+        return fallback
+    raise ValueError("Could not find SQL query in model response.")
+
+
+def find_complete_sql(partial_response):
+    """
+    Detect a finished SQL statement in a partially streamed model response
+
+    A statement is finished once its code block is closed, or once the
+    terminating ';' arrives inside an open code block. Without a code block only a
+    SELECT ... FROM ...; starting the response or a line counts, so a "select ...;"
+    in prose is left for extract_sql at the end of the stream. A ';' inside a
+    quoted literal does not end the statement.
+
+    Args:
+        partial_response (str): Text streamed so far
+
+    Returns:
+        str or None: The SQL statement if complete, otherwise None
+    """
+    if "```" in partial_response:
+        code_block = CODE_BLOCK_PATTERN.search(partial_response)
+        if code_block:
+            return code_block.group(1).strip()
+        open_block = OPEN_CODE_BLOCK_PATTERN.search(partial_response)
+        end = statement_end(partial_response, open_block.end())
+        return partial_response[open_block.end():end].strip() if end else None
+    return _bare_statement(partial_response)
@@ -20,4 +20,27 @@ CREATE TABLE account_weekly_snapshot (
     last_updated_date DATETIME NOT NULL,
     PRIMARY KEY (bank, type, last_updated_date),
     FOREIGN KEY (bank, type) REFERENCES accounts(bank, type) ON DELETE CASCADE
-);
\ No newline at end of file
+);
+
+-- Most recent account_weekly_snapshot row per account, refreshed by the backend on every snapshot load
+CREATE TABLE latest_account_snapshot (
+    bank VARCHAR(100) NOT NULL,
+    type ENUM('credit', 'checking', 'stocks', 'crypto') NOT NULL,
+    balance DECIMAL(10,2) NOT NULL,
+    payment_due DECIMAL(10,2) NOT NULL,
+    last_updated_date DATETIME NOT NULL,
+    PRIMARY KEY (bank, type),
+    FOREIGN KEY (bank, type) REFERENCES accounts(bank, type) ON DELETE CASCADE
+);
+
+
+-- Per-week, per-type totals (each account's latest balance as of the week), maintained by the backend on every load
+CREATE TABLE weekly_account_rollup (
+    week_start DATE NOT NULL,
+    type ENUM('credit', 'checking', 'stocks', 'crypto') NOT NULL,
+    total_balance DECIMAL(14,2) NOT NULL,
+    total_payment_due DECIMAL(14,2) NOT NULL,
+    total_credit_limit BIGINT NOT NULL,
+    account_count INTEGER NOT NULL,
+    PRIMARY KEY (week_start, type)
+);
@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 import requests
+import time
 from datetime import datetime
 import pytz
 from components.question_selector import create_simple_question_selector
@@ -10,6 +11,34 @@ datetime.now(eastern)
 
 BACKEND_URL = "http://backend:8000"
 
+# Ask the backend for column-oriented results; they decode straight into a DataFrame
+COLUMNAR_HEADERS = {"Accept": "application/vnd.finance.columnar+json"}
+
+
+def result_to_dataframe(result):
+    """Build a DataFrame from a backend result in either columnar or row-record form"""
+    return pd.DataFrame(result.get("data") or [], columns=result.get("columns", []))
+
+
+def wait_for_job(job_id, timeout=120, interval=1):
+    """Poll a backend ingestion job until it finishes; returns the job, or None on timeout"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = requests.get(f"{BACKEND_URL}/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(interval)
+    return None
+
+
+def show_job_result(job, success_message):
+    if job is None:
+        st.info("Ingestion is still running in the background; check /jobs for its status.")
+    elif job["status"] == "succeeded":
+        st.success(f"{success_message} Changes: {job['changes']}")
+    else:
+        st.error(f"Ingestion failed: {job['error']}")
+
 # Initialize session state
 if "page" not in st.session_state:
     st.session_state.page = "home"
@@ -175,7 +204,7 @@ if st.session_state.page == "home":
         
         # Use the new smart_query endpoint - THIS ONLY RUNS FOR NEW QUERIES
         with st.spinner("🤖 Processing your question..."):
-            response = requests.post(f"{BACKEND_URL}/smart_query", json={"question": nl_query})
+            response = requests.post(f"{BACKEND_URL}/smart_query", json={"question": nl_query}, headers=COLUMNAR_HEADERS)
         
         if response.status_code == 200:
             st.session_state.ai_response_data = response.json()
@@ -226,9 +255,9 @@ if st.session_state.page == "home":
                 # Show results directly
                 columns = response_data.get("columns", [])
                 data = response_data.get("data", [])
+                df = result_to_dataframe(response_data)
                 
-                if data:
-                    df = pd.DataFrame(data, columns=columns)
+                if not df.empty:
                     st.markdown("### Results:")
                     st.dataframe(df)
                     st.success("✅ Query executed successfully!")
@@ -257,14 +286,14 @@ if st.session_state.page == "home":
             # Execute SQL button for low confidence queries - THIS IS FAST NOW
             if st.button("🔍 Execute SQL"):
                 with st.spinner("Executing SQL..."):
-                    result = requests.post(f"{BACKEND_URL}/execute_sql", json={"sql": generated_sql})
+                    result = requests.post(f"{BACKEND_URL}/execute_sql", json={"sql": generated_sql}, headers=COLUMNAR_HEADERS)
                 if result.status_code == 200:
                     response_json = result.json()
                     columns = response_json.get("columns", [])
                     data = response_json.get("data", [])
+                    df = result_to_dataframe(response_json)
                     
-                    if data:
-                        df = pd.DataFrame(data, columns=columns)
+                    if not df.empty:
                         st.markdown("### Query Results:")
                         st.dataframe(df)
                         st.session_state.query_results = {"columns": columns, "data": data}
@@ -354,14 +383,12 @@ if st.session_state.page == "home":
                 if st.button("🔍 Test Edited SQL"):
                     if st.session_state.edited_sql.strip():
                         with st.spinner("Testing edited SQL..."):
-                            result = requests.post(f"{BACKEND_URL}/execute_sql", json={"sql": st.session_state.edited_sql})
+                            result = requests.post(f"{BACKEND_URL}/execute_sql", json={"sql": st.session_state.edited_sql}, headers=COLUMNAR_HEADERS)
                         if result.status_code == 200:
                             response_json = result.json()
-                            columns = response_json.get("columns", [])
-                            data = response_json.get("data", [])
+                            df = result_to_dataframe(response_json)
                             
-                            if data:
-                                df = pd.DataFrame(data, columns=columns)
+                            if not df.empty:
                                 st.markdown("### Corrected Query Results:")
                                 st.dataframe(df)
                                 st.success("✅ Edited SQL works! You can now save the feedback.")
@@ -492,8 +519,10 @@ elif st.session_state.page == "admin":
                 
                 # Call backend API to reload snapshots into DB
                 reload_resp = requests.post(f"{BACKEND_URL}/reload_snapshots")
-                if reload_resp.status_code == 200:
-                    st.success("Snapshot data saved and backend DB reloaded successfully!")
+                if reload_resp.status_code == 202:
+                    with st.spinner("Reloading snapshots into the database..."):
+                        job = wait_for_job(reload_resp.json()["job_id"])
+                    show_job_result(job, "Snapshot data saved and backend DB reloaded successfully!")
                 else:
                     st.warning("Snapshot saved but failed to reload backend DB.")
             else:
@@ -501,6 +530,23 @@ elif st.session_state.page == "admin":
         except Exception as e:
             st.error(f"Error saving data: {str(e)}")
 
+    st.markdown("### Upload Data File")
+    uploaded_file = st.file_uploader("Excel or CSV with accounts or snapshot rows", type=["xlsx", "xls", "csv"])
+    if uploaded_file is not None and st.button("📤 Upload and Ingest"):
+        try:
+            upload_resp = requests.post(
+                f"{BACKEND_URL}/upload",
+                files={"file": (uploaded_file.name, uploaded_file.getvalue())}
+            )
+            if upload_resp.status_code == 202:
+                with st.spinner(f"Ingesting {uploaded_file.name}..."):
+                    job = wait_for_job(upload_resp.json()["job_id"])
+                show_job_result(job, f"{uploaded_file.name} ingested.")
+            else:
+                st.error(f"Upload rejected: {upload_resp.json().get('detail', upload_resp.text)}")
+        except Exception as e:
+            st.error(f"Error uploading file: {str(e)}")
+
 # --- DEVELOPER PAGE ---
 elif st.session_state.page == "developer":
     st.header("🧪 Developer Notebook")
@@ -518,7 +564,7 @@ elif st.session_state.page == "developer":
         with col_dev1:
             st.session_state.notebook_sql = st.text_area("Write SQL to test:", height=150)
             if st.button("⚙️ Run Notebook SQL"):
-                result = requests.post(f"{BACKEND_URL}/execute_sql", json={"sql": st.session_state.notebook_sql})
+                result = requests.post(f"{BACKEND_URL}/execute_sql", json={"sql": st.session_state.notebook_sql}, headers=COLUMNAR_HEADERS)
                 if result.status_code == 200:
                     st.session_state.notebook_result = result.json()
                 else:
@@ -528,7 +574,7 @@ elif st.session_state.page == "developer":
             if st.session_state.get("notebook_result"):
                 st.markdown("### 📄 Notebook Output")
                 if "data" in st.session_state.notebook_result:
-                    st.dataframe(st.session_state.notebook_result["data"])
+                    st.dataframe(result_to_dataframe(st.session_state.notebook_result))
                     if st.session_state.mode == "bad":
                         if st.button("📋 Use This SQL"):
                             st.session_state.edited_sql = st.session_state.notebook_sql
@@ -559,7 +605,7 @@ elif st.session_state.page == "developer":
             with col_test2:
                 st.markdown("#### Smart /smart_query endpoint")
                 if st.button("Test Smart Query"):
-                    response = requests.post(f"{BACKEND_URL}/smart_query", json={"question": test_query})
+                    response = requests.post(f"{BACKEND_URL}/smart_query", json={"question": test_query}, headers=COLUMNAR_HEADERS)
                     if response.status_code == 200:
                         data = response.json()
                         st.json(data)
@@ -567,7 +613,7 @@ elif st.session_state.page == "developer":
                         if data.get("confidence") == "high":
                             st.success("High confidence - would show results directly")
                             if data.get("data"):
-                                df = pd.DataFrame(data["data"], columns=data.get("columns", []))
+                                df = result_to_dataframe(data)
                                 st.dataframe(df)
                         else:
                             st.warning("Low confidence - would show SQL for review")